@@ -0,0 +1,150 @@
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+# Sample rate audio is decoded to; Whisper expects 16 kHz mono
+SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
+# Keep decoded audio next to a job's results so re-transcription skips decoding the source:
+# "none", "pcm" (raw float32, read without ffmpeg) or "flac" (lossless, about a third of the size)
+AUDIO_CACHE_FORMAT = os.getenv("AUDIO_CACHE_FORMAT", "none")
+AUDIO_CACHE_EXTENSIONS = {"pcm": ".f32", "flac": ".flac"}
+
+if AUDIO_CACHE_FORMAT != "none" and AUDIO_CACHE_FORMAT not in AUDIO_CACHE_EXTENSIONS:
+    raise ValueError(f"AUDIO_CACHE_FORMAT must be none, {' or '.join(AUDIO_CACHE_EXTENSIONS)}, not {AUDIO_CACHE_FORMAT!r}")
+
+
+def audio_cache_path(folder: str, source_path: str) -> Optional[str]:
+    """
+    Path of the decoded-audio cache for a source file, or None when caching is off.
+    The name holds the source's file name and a hash of its path, size and mtime, so
+    talk.mp4 and talk.mp3 (same media_name) or an edited source never share a cache.
+    """
+    if AUDIO_CACHE_FORMAT == "none":
+        return None
+    stat = os.stat(source_path)
+    identity = f"{os.path.abspath(source_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    digest = hashlib.blake2b(identity.encode(), digest_size=6).hexdigest()
+    return os.path.join(folder, f"{os.path.basename(source_path)}.{digest}{_cache_suffix()}")
+
+
+def _cache_suffix() -> str:
+    return f".{SAMPLE_RATE // 1000}k{AUDIO_CACHE_EXTENSIONS[AUDIO_CACHE_FORMAT]}"
+
+
+def cached_audio(cache_path: Optional[str]) -> Optional[str]:
+    """cache_path if it has been written (its name already identifies the source version)."""
+    if cache_path and os.path.exists(cache_path):
+        return cache_path
+    return None
+
+
+def _remove_stale_caches(cache_path: str) -> None:
+    """Delete caches decoded from earlier versions of the same source file name."""
+    folder, name = os.path.split(cache_path)
+    source_name = name[:-len(_cache_suffix())].rsplit(".", 1)[0]
+    for path in glob.glob(os.path.join(glob.escape(folder), f"{glob.escape(source_name)}.*{_cache_suffix()}")):
+        if path != cache_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _is_pcm(path: str) -> bool:
+    return path.endswith(AUDIO_CACHE_EXTENSIONS["pcm"])
+
+
+def probe_duration(path: str) -> float:
+    """Media duration in seconds from the container header, without decoding."""
+    if _is_pcm(path):
+        return os.path.getsize(path) / 4 / SAMPLE_RATE
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+            capture_output=True, text=True, check=True
+        )
+        return float(json.loads(result.stdout)["format"]["duration"])
+    except (subprocess.CalledProcessError, FileNotFoundError, KeyError, ValueError) as e:
+        raise ValueError(f"Failed to read duration of {path}: {e}")
+
+
+def _read_pcm_windows(path: str, window_samples: int, start_sample: int, end_sample: Optional[int]
+                      ) -> Iterator[Tuple[int, np.ndarray]]:
+    with open(path, "rb") as f:
+        f.seek(start_sample * 4)
+        offset = start_sample
+        while end_sample is None or offset < end_sample:
+            count = window_samples if end_sample is None else min(window_samples, end_sample - offset)
+            window = np.fromfile(f, dtype=np.float32, count=count)
+            if not len(window):
+                break
+            yield offset, window
+            offset += len(window)
+
+
+def stream_audio_windows(path: str, window_seconds: float, start_sample: int = 0,
+                         max_duration: Optional[float] = None, sample_rate: int = SAMPLE_RATE,
+                         cache_path: Optional[str] = None) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Decode the first audio stream of `path` (audio or video) with ffmpeg, downmixed
+    to mono and resampled to sample_rate, and yield (start_sample, float32 window)
+    for consecutive windows of window_seconds (the last one may be shorter).
+    Decoding starts at start_sample and stops at max_duration seconds, so memory
+    is bounded by one window however long the file is.
+
+    Raw PCM caches (.f32) are read directly. With cache_path, the same ffmpeg
+    process also writes the whole decoded track there (PCM or FLAC by extension);
+    the cache only appears once decoding has finished successfully.
+    """
+    window_samples = int(window_seconds * sample_rate)
+    if _is_pcm(path):
+        end_sample = int(max_duration * sample_rate) if max_duration is not None else None
+        yield from _read_pcm_windows(path, window_samples, start_sample, end_sample)
+        return
+
+    start_seconds = start_sample / sample_rate
+    command = ["ffmpeg", "-v", "error", "-nostdin", "-y"]
+    if start_sample:
+        command += ["-ss", f"{start_seconds:.6f}"]
+    command += ["-i", path]
+    if max_duration is not None:
+        command += ["-t", f"{max(0.0, max_duration - start_seconds):.6f}"]
+    command += ["-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "f32le", "pipe:1"]
+    partial_path = None
+    if cache_path:
+        partial_path = cache_path + ".part"
+        cache_format = ["-f", "f32le"] if _is_pcm(cache_path) else ["-c:a", "flac", "-f", "flac"]
+        command += ["-vn", "-ac", "1", "-ar", str(sample_rate), *cache_format, partial_path]
+
+    # stderr goes to a file so a chatty decoder can never block on a full pipe
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=stderr)
+        try:
+            offset = start_sample
+            while True:
+                data = process.stdout.read(window_samples * 4)
+                if len(data) < 4:
+                    break
+                window = np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32).copy()
+                yield offset, window
+                offset += len(window)
+            if process.wait() != 0:
+                stderr.seek(0)
+                raise ValueError(f"Failed to decode audio from {path}: {stderr.read().decode(errors='replace')}")
+            if partial_path:
+                os.replace(partial_path, cache_path)
+                partial_path = None
+                _remove_stale_caches(cache_path)
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            if partial_path and os.path.exists(partial_path):
+                os.remove(partial_path)
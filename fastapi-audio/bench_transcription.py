@@ -0,0 +1,66 @@
+"""
+Benchmark Whisper transcription: the per-window loop vs. batched windows with
+overlap stitching. Reports the realtime factor (processing seconds per second of
+audio; below 1.0 is faster than realtime) on the current device.
+
+Usage:
+    python bench_transcription.py ../contents/media/<media_file> --duration 120 --batch-sizes 1 4 8 16 --overlap 1.0
+"""
+import argparse
+import time
+
+from audio_stream import stream_audio_windows, SAMPLE_RATE
+from model_registry import registry, DEVICE
+from transcription import transcribe_windows
+
+WINDOW_SECONDS = 5
+
+
+def per_window(transcriber, windows):
+    # Mirrors the original loop: one pipeline call per 5-second window, no context
+    return [transcriber({"raw": audio, "sampling_rate": SAMPLE_RATE})["text"].strip() for _, audio in windows]
+
+
+def batched(transcriber, windows, batch_size, overlap):
+    return [
+        transcript
+        for batch in transcribe_windows(transcriber, iter(windows), SAMPLE_RATE, batch_size, overlap)
+        for _, _, transcript in batch
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("media_path")
+    parser.add_argument("--duration", type=float, default=120.0)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--overlap", type=float, default=1.0)
+    args = parser.parse_args()
+
+    windows = list(stream_audio_windows(args.media_path, WINDOW_SECONDS, max_duration=args.duration))
+    if not windows:
+        raise SystemExit("No audio decoded")
+    audio_seconds = sum(len(audio) for _, audio in windows) / SAMPLE_RATE
+    transcriber = registry.get("whisper")
+
+    # Warm-up pass so one-off allocation costs don't skew the first run
+    per_window(transcriber, windows[:1])
+
+    start = time.perf_counter()
+    baseline = per_window(transcriber, windows)
+    base_elapsed = time.perf_counter() - start
+    print(f"device={DEVICE} windows={len(windows)} audio={audio_seconds:.1f}s overlap={args.overlap}s")
+    print(f"{'mode':<16}{'seconds':>10}{'RTF':>8}{'speedup':>10}{'words':>8}")
+    print(f"{'per-window':<16}{base_elapsed:>10.2f}{base_elapsed / audio_seconds:>8.3f}{1.0:>10.2f}"
+          f"{sum(len(t.split()) for t in baseline):>8}")
+
+    for batch_size in args.batch_sizes:
+        start = time.perf_counter()
+        transcripts = batched(transcriber, windows, batch_size, args.overlap)
+        elapsed = time.perf_counter() - start
+        print(f"{f'batch={batch_size}':<16}{elapsed:>10.2f}{elapsed / audio_seconds:>8.3f}"
+              f"{base_elapsed / elapsed:>10.2f}{sum(len(t.split()) for t in transcripts):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import os
+import time
+from typing import Any, Dict, List, Type
+
+from sqlalchemy import insert
+from sqlmodel import Session, SQLModel
+
+# Rows per multi-row INSERT statement
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", "500"))
+
+
+class BulkWriter:
+    """
+    Writes rows with multi-row INSERT ... RETURNING id statements on the session's
+    connection instead of one ORM add/flush round-trip per row. Generated IDs are
+    returned in the same order as the input rows.
+    """
+
+    def __init__(self, session: Session, batch_size: int = BULK_BATCH_SIZE):
+        self.session = session
+        self.batch_size = max(1, batch_size)
+        self.rows = 0
+        self.statements = 0
+        self.seconds = 0.0
+
+    def insert(self, model: Type[SQLModel], rows: List[Dict[str, Any]], returning: bool = True) -> List[int]:
+        if not rows:
+            return []
+        start = time.perf_counter()
+        table = model.__table__
+        ids: List[int] = []
+        for offset in range(0, len(rows), self.batch_size):
+            batch = rows[offset:offset + self.batch_size]
+            if returning:
+                stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+                ids.extend(self.session.execute(stmt, batch).scalars().all())
+            else:
+                self.session.execute(insert(table), batch)
+            self.statements += 1
+        self.rows += len(rows)
+        self.seconds += time.perf_counter() - start
+        return ids
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "statements": self.statements,
+            "seconds": round(self.seconds, 3),
+            "rows_per_sec": round(self.rows / self.seconds, 1) if self.seconds else None,
+        }
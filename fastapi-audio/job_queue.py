@@ -0,0 +1,219 @@
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Type
+
+from sqlalchemy import func
+from sqlmodel import Session, SQLModel, select
+
+from database import engine
+
+# Seconds an idle worker waits before polling for pending jobs again
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "2"))
+# Running jobs refresh heartbeat_at this often; jobs silent for JOB_STALE_SECONDS are orphaned
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "15"))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "120"))
+# Claims per job before an orphaned job is failed instead of re-queued
+MAX_JOB_ATTEMPTS = int(os.getenv("MAX_JOB_ATTEMPTS", "3"))
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def claim_job(model: Type[SQLModel]) -> Optional[int]:
+    """
+    Atomically take the highest-priority, oldest pending job and mark it processing.
+    SELECT ... FOR UPDATE SKIP LOCKED lets any number of workers poll the same
+    table without claiming a job twice or waiting on each other's row locks.
+    """
+    with Session(engine) as session:
+        job = session.exec(
+            select(model)
+            .where(model.status == "pending")
+            .order_by(model.priority.desc(), model.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).first()
+        if job is None:
+            return None
+        now = datetime.utcnow()
+        job.status = "processing"
+        job.worker_id = worker_id()
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        session.commit()
+        return job.id
+
+
+def recover_orphaned_jobs(model: Type[SQLModel]) -> int:
+    """
+    Re-queue processing jobs whose worker is gone: no heartbeat for JOB_STALE_SECONDS,
+    or a worker on this host whose process no longer exists. Jobs that already
+    used MAX_JOB_ATTEMPTS claims are marked as errors. Returns the number recovered.
+    """
+    host = socket.gethostname()
+    stale_before = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    recovered = 0
+    with Session(engine) as session:
+        jobs = session.exec(
+            select(model).where(model.status == "processing").with_for_update(skip_locked=True)
+        ).all()
+        for job in jobs:
+            job_host, _, pid = (job.worker_id or "").rpartition(":")
+            dead_local_worker = job_host == host and pid.isdigit() and not _pid_alive(int(pid))
+            if not dead_local_worker and job.heartbeat_at is not None and job.heartbeat_at >= stale_before:
+                continue
+            if job.attempts >= MAX_JOB_ATTEMPTS:
+                job.status = "error"
+                job.error_msg = f"Worker lost {job.attempts} times; giving up"
+            else:
+                job.status = "pending"
+            print(f"Recovered orphaned job {job.id} from worker {job.worker_id or 'unknown'} -> {job.status}")
+            job.worker_id = None
+            job.updated_at = datetime.utcnow()
+            recovered += 1
+        session.commit()
+    return recovered
+
+
+class Heartbeat:
+    """Context manager that refreshes a running job's heartbeat_at from a background thread."""
+
+    def __init__(self, model: Type[SQLModel], job_id: int, interval: float = JOB_HEARTBEAT_SECONDS):
+        self.model = model
+        self.job_id = job_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{job_id}", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                with Session(engine) as session:
+                    job = session.get(self.model, self.job_id)
+                    if job is None or job.status != "processing":
+                        return
+                    job.heartbeat_at = datetime.utcnow()
+                    session.commit()
+            except Exception as e:
+                print(f"Heartbeat for job {self.job_id} failed: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def queue_status(model: Type[SQLModel]) -> Dict[str, Any]:
+    with Session(engine) as session:
+        counts = session.exec(select(model.status, func.count()).group_by(model.status)).all()
+    return {status: count for status, count in counts}
+
+
+def worker_loop(model: Type[SQLModel], run_job: Callable[[int], None], stop: Optional[Any] = None) -> None:
+    """Claim and run jobs one at a time until stop is set."""
+    print(f"Worker {worker_id()} started for {model.__name__}")
+    while stop is None or not stop.is_set():
+        try:
+            job_id = claim_job(model)
+        except Exception as e:
+            print(f"Worker {worker_id()} could not claim a job: {e}")
+            job_id = None
+        if job_id is None:
+            if stop is not None:
+                stop.wait(JOB_POLL_SECONDS)
+            else:
+                time.sleep(JOB_POLL_SECONDS)
+            continue
+        print(f"Worker {worker_id()} running job {job_id}")
+        try:
+            with Heartbeat(model, job_id):
+                run_job(job_id)
+        except Exception as e:
+            # Jobs record their own errors; this only keeps the worker alive
+            print(f"Worker {worker_id()} failed job {job_id}: {e}")
+
+
+class WorkerPool:
+    """
+    Supervises `workers` processes, each running target(stop_event). Orphaned jobs
+    are recovered when the pool starts and every JOB_STALE_SECONDS after that;
+    worker processes that die are replaced.
+    """
+
+    def __init__(self, model: Type[SQLModel], target: Callable, workers: int, name: str = "worker"):
+        self.model = model
+        self.target = target
+        self.workers = max(0, workers)
+        self.name = name
+        self._context = multiprocessing.get_context("spawn")
+        self._stop = self._context.Event()
+        self._processes: List[multiprocessing.Process] = []
+        self._supervisor: Optional[threading.Thread] = None
+
+    def _spawn(self, index: int) -> multiprocessing.Process:
+        # Not daemonic, so jobs may start processes of their own
+        process = self._context.Process(target=self.target, args=(self._stop,), name=f"{self.name}-{index}")
+        process.start()
+        return process
+
+    def _supervise(self) -> None:
+        last_recovery = time.monotonic()
+        while not self._stop.wait(JOB_POLL_SECONDS):
+            for index, process in enumerate(self._processes):
+                if not process.is_alive():
+                    print(f"{process.name} exited with code {process.exitcode}; restarting")
+                    self._processes[index] = self._spawn(index)
+            if time.monotonic() - last_recovery >= JOB_STALE_SECONDS:
+                last_recovery = time.monotonic()
+                try:
+                    recover_orphaned_jobs(self.model)
+                except Exception as e:
+                    print(f"Orphaned job recovery failed: {e}")
+
+    def start(self) -> None:
+        if self.workers == 0:
+            return
+        recover_orphaned_jobs(self.model)
+        self._processes = [self._spawn(index) for index in range(self.workers)]
+        self._supervisor = threading.Thread(target=self._supervise, name=f"{self.name}-supervisor", daemon=True)
+        self._supervisor.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop claiming jobs; running jobs are interrupted after timeout and recovered on the next start."""
+        self._stop.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+
+    def join(self) -> None:
+        if self._supervisor is not None:
+            self._supervisor.join()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "alive": sum(process.is_alive() for process in self._processes),
+            "jobs": queue_status(self.model),
+        }
@@ -1,22 +1,45 @@
 import os
 import json
 import subprocess
-from fastapi import FastAPI, Depends, BackgroundTasks, HTTPException
+from fastapi import FastAPI, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 from database import create_db_and_tables, get_session, engine
-from models import AudioJob, AudioTranscriptChunk
+from models import ACTIVE_JOB_STATUSES, AudioJob, AudioTranscriptChunk
 from datetime import datetime
-from transformers import pipeline
-import torchaudio
+from audio_stream import probe_duration, stream_audio_windows, audio_cache_path, cached_audio, SAMPLE_RATE
+from transcription import transcribe_windows, TRANSCRIBE_CONFIG, WINDOW_SECONDS
+from vad import speech_segments, VAD_MODE, VAD_CONFIG
 from semantic_search import generate_transcript_embeddings, semantic_search
-import torch
+from model_registry import registry, MODEL_VERSION
+from bulk_writer import BulkWriter
+from vector_codec import VECTOR_PRECISION
+from fingerprint import file_identity, job_fingerprint
+from job_queue import WorkerPool
+from worker import audio_worker, AUDIO_WORKERS, EMBEDDED_WORKERS
 
 app = FastAPI()
 
+# Job statuses an identical new request is attached to instead of starting a new job
+REUSABLE_JOB_STATUSES = ("pending", "processing", "complete")
+
+def find_identical_job(session: Session, fingerprint: str, statuses=REUSABLE_JOB_STATUSES):
+    """Most recent job with this fingerprint in one of statuses, or None."""
+    return session.exec(
+        select(AudioJob)
+        .where((AudioJob.fingerprint == fingerprint) & (AudioJob.status.in_(statuses)))
+        .order_by(AudioJob.id.desc())
+    ).first()
+
+# Jobs run in worker processes, not the web server; see worker.py
+worker_pool = WorkerPool(AudioJob, audio_worker, AUDIO_WORKERS if EMBEDDED_WORKERS else 0, name="audio-worker")
+
 class MediaRequest(BaseModel):
     file_name: str  # e.g., "example.mp4" or "example.mp3"
     duration: int | None = None  # Optional duration in seconds
+    force: bool = False  # process again even if an identical job exists
+    priority: int = 0  # higher-priority jobs are picked up by workers first
 
 class SearchRequest(BaseModel):
     query: str
@@ -41,24 +64,21 @@ def check_audio_stream(file_path: str):
     except (subprocess.CalledProcessError, FileNotFoundError):
         return False
 
-def extract_audio_from_video(video_path: str, audio_path: str):
-    """Extract audio from video file using FFmpeg."""
-    try:
-        subprocess.run(
-            ["ffmpeg", "-i", video_path, "-vn", "-acodec", "mp3", "-y", audio_path],
-            capture_output=True, check=True
-        )
-    except subprocess.CalledProcessError as e:
-        raise ValueError(f"Failed to extract audio from {video_path}: {e.stderr.decode()}")
-
 @app.on_event("startup")
 def on_startup():
     check_ffmpeg()  # Ensure FFmpeg is available on startup
     create_db_and_tables()
     os.makedirs("../contents/media", exist_ok=True)
+    # The API only embeds search queries; job workers load Whisper
+    registry.warm_up(["embedder"])
+    worker_pool.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    worker_pool.stop()
 
 @app.post("/process_media_audio/")
-def process_media_audio(request: MediaRequest, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
+def process_media_audio(request: MediaRequest, session: Session = Depends(get_session)):
     file_name = request.file_name
     media_name = file_name.rsplit('.', 1)[0] if '.' in file_name else file_name
     media_path = os.path.join("..", "contents", "media", file_name)
@@ -69,12 +89,35 @@ def process_media_audio(request: MediaRequest, background_tasks: BackgroundTasks
     if not check_audio_stream(media_path):
         raise HTTPException(status_code=400, detail=f"No audio stream found in: {media_path}")
 
-    job = AudioJob(file_name=file_name, media_name=media_name, status="pending")
+    fingerprint = job_fingerprint(
+        source=file_identity(media_path), duration=request.duration, models=MODEL_VERSION,
+        vector_precision=VECTOR_PRECISION, vad=VAD_CONFIG, transcribe=TRANSCRIBE_CONFIG
+    )
+    # An identical completed job is returned as is; an identical pending or
+    # running job is joined (callers poll the same job_id)
+    existing = None if request.force else find_identical_job(session, fingerprint)
+    if existing:
+        return {"job_id": existing.id, "file_name": file_name, "media_name": existing.media_name,
+                "status": existing.status, "deduplicated": True}
+
+    # Queue the job; a worker claims it from the table (see job_queue.claim_job)
+    job = AudioJob(file_name=file_name, media_name=media_name, status="pending", fingerprint=fingerprint,
+                   settings=json.dumps({"duration": request.duration}), priority=request.priority)
     session.add(job)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        # An identical job was queued concurrently (possibly by another API process):
+        # the unique index on active fingerprints rejected this one, so join that job
+        session.rollback()
+        existing = find_identical_job(session, fingerprint, ACTIVE_JOB_STATUSES)
+        if existing is None:
+            raise
+        return {"job_id": existing.id, "file_name": file_name, "media_name": existing.media_name,
+                "status": existing.status, "deduplicated": True}
     session.refresh(job)
-    background_tasks.add_task(process_audio, job.id, media_path, media_name, request.duration)
-    return {"job_id": job.id, "file_name": file_name, "media_name": media_name}
+    return {"job_id": job.id, "file_name": file_name, "media_name": media_name, "status": job.status,
+            "deduplicated": False}
 
 def process_audio(job_id: int, media_path: str, media_name: str, provided_duration: int | None = None):
     with Session(engine) as session:
@@ -87,73 +130,66 @@ def process_audio(job_id: int, media_path: str, media_name: str, provided_durati
             os.makedirs(base_folder, exist_ok=True)
             json_path = os.path.join(base_folder, "transcript_data.json")
 
-            # Check if media is video (extract audio) or audio (use directly)
-            file_ext = os.path.splitext(media_path)[1].lower()
-            audio_path = media_path
-            if file_ext in ['.mp4', '.avi', '.mov', '.mkv']:  # Video formats
-                audio_path = os.path.join(base_folder, f"{media_name}.mp3")
-                extract_audio_from_video(media_path, audio_path)
+            resume_sample = job.checkpoint_sample
 
-            # Load audio
-            try:
-                waveform, sample_rate = torchaudio.load(audio_path)
-            except Exception as e:
-                raise ValueError(f"Failed to load audio from {audio_path}: {str(e)}")
-
-            if waveform.shape[0] > 1:  # Convert to mono if stereo
-                waveform = waveform.mean(dim=0, keepdim=True)
-
-            # Get total duration
-            info = torchaudio.info(audio_path)
-            total_duration = info.num_frames / info.sample_rate
-            max_duration = provided_duration if provided_duration is not None else total_duration
-            print(f"Processing media {media_path} with duration: {total_duration:.2f} seconds, max_duration: {max_duration:.2f} seconds")
-
-            # Load Whisper model
-            transcriber = pipeline("automatic-speech-recognition", model="openai/whisper-tiny", device=0 if torch.cuda.is_available() else -1)
-
-            # Process audio in chunks (5 seconds each)
-            chunk_duration = 5  # seconds
-            sample_rate_hz = sample_rate
-            chunk_samples = int(chunk_duration * sample_rate_hz)
-            total_samples = waveform.shape[1]
-            max_duration_samples = int(max_duration * sample_rate_hz)
+            # Audio and video files are decoded by ffmpeg straight to 16 kHz mono PCM over a
+            # pipe; with AUDIO_CACHE_FORMAT set, a decoded copy is kept for later re-runs
+            cache_path = audio_cache_path(base_folder, media_path)
+            audio_path = cached_audio(cache_path) or media_path
+
+            # Duration from the container header; audio is decoded window by window below
+            total_duration = probe_duration(audio_path)
+            max_duration = min(provided_duration, total_duration) if provided_duration is not None else total_duration
+            print(f"Processing media {audio_path} with duration: {total_duration:.2f} seconds, max_duration: {max_duration:.2f} seconds")
+            # The cache is only written by a run that decodes the whole track from the start
+            write_cache = cache_path if audio_path == media_path and not resume_sample and max_duration >= total_duration else None
+
+            # Get shared Whisper model (loaded once per process)
+            transcriber = registry.get("whisper")
+
+            # Process audio in chunks (WINDOW_SECONDS each), streamed from ffmpeg as 16 kHz mono
+            chunk_duration = WINDOW_SECONDS
+            sample_rate_hz = SAMPLE_RATE
             chunk_index = 0
             all_transcripts = []
+            writer = BulkWriter(session)
+            if resume_sample:
+                all_transcripts = [
+                    {"chunk_index": chunk.chunk_index, "start_time": chunk.start_time, "end_time": chunk.end_time,
+                     "transcript": chunk.transcript}
+                    for chunk in session.exec(
+                        select(AudioTranscriptChunk)
+                        .where(AudioTranscriptChunk.job_id == job_id)
+                        .order_by(AudioTranscriptChunk.chunk_index)
+                    ).all()
+                ]
+                chunk_index = all_transcripts[-1]["chunk_index"] + 1 if all_transcripts else 0
+                print(f"Resuming job {job_id} at sample {resume_sample} ({len(all_transcripts)} chunks already stored)")
 
-            for start_sample in range(0, min(total_samples, max_duration_samples), chunk_samples):
-                end_sample = min(start_sample + chunk_samples, total_samples)
-                chunk_waveform = waveform[:, start_sample:end_sample]
-                
-                # Transcribe chunk
-                try:
-                    result = transcriber({"raw": chunk_waveform.squeeze().numpy(), "sampling_rate": sample_rate_hz})
-                    transcript = result["text"] if result and "text" in result else ""
-                except Exception as e:
-                    print(f"Transcription failed for chunk {chunk_index}: {str(e)}")
-                    transcript = ""
-
-                # Save transcript chunk to DB
-                start_time = start_sample / sample_rate_hz
-                end_time = end_sample / sample_rate_hz
-                chunk_record = AudioTranscriptChunk(
-                    job_id=job.id,
-                    chunk_index=chunk_index,
-                    start_time=start_time,
-                    end_time=end_time,
-                    transcript=transcript
-                )
-                session.add(chunk_record)
-                session.commit()
-
-                # Save transcript info for JSON
-                all_transcripts.append({
-                    "chunk_index": chunk_index,
-                    "start_time": start_time,
-                    "end_time": end_time,
+            windows = stream_audio_windows(audio_path, chunk_duration, resume_sample, max_duration, sample_rate_hz,
+                                           cache_path=write_cache)
+            if VAD_MODE != "off":
+                # Only speech is transcribed; chunks follow the detected speech segments
+                windows = speech_segments(windows, sample_rate_hz)
+            # Windows are transcribed WHISPER_BATCH_SIZE at a time with overlapping context
+            for batch in transcribe_windows(transcriber, windows, sample_rate_hz):
+                # Save the transcript chunks (also used for JSON)
+                batch_info = [{
+                    "chunk_index": chunk_index + i,
+                    "start_time": start_sample / sample_rate_hz,
+                    "end_time": (start_sample + num_samples) / sample_rate_hz,
                     "transcript": transcript
-                })
-                chunk_index += 1
+                } for i, (start_sample, num_samples, transcript) in enumerate(batch)]
+                writer.insert(AudioTranscriptChunk, [{"job_id": job_id, **info} for info in batch_info],
+                              returning=False)
+                all_transcripts.extend(batch_info)
+                chunk_index += len(batch_info)
+
+                # Checkpoint: a failed or interrupted job resumes after this batch
+                start_sample, num_samples, _ = batch[-1]
+                job.checkpoint_sample = start_sample + num_samples
+                job.updated_at = datetime.utcnow()
+                session.commit()
 
             # Generate embeddings for transcript chunks
             try:
@@ -161,25 +197,41 @@ def process_audio(job_id: int, media_path: str, media_name: str, provided_durati
             except Exception as e:
                 print(f"Embedding generation failed: {str(e)}")
 
+            # Share of the audio without transcribed speech (chunks cover exactly the speech segments)
+            speech_seconds = sum(info["end_time"] - info["start_time"] for info in all_transcripts)
+            vad_skip_ratio = max(0.0, 1 - speech_seconds / max_duration) if max_duration > 0 else 0.0
+
             # Save JSON file
             with open(json_path, "w", encoding="utf-8") as f:
                 json.dump({
                     "media_name": media_name,
                     "media_file": job.file_name,
+                    "vad": {**VAD_CONFIG, "speech_seconds": speech_seconds, "skip_ratio": vad_skip_ratio},
                     "transcript_chunks": all_transcripts,
                 }, f, indent=2)
 
             job.status = "complete"
+            job.vad_skip_ratio = vad_skip_ratio
             job.result_json_path = json_path
             job.updated_at = datetime.utcnow()
             session.commit()
 
         except Exception as e:
+            # Discard rows written after the last checkpoint; /job/{id}/resume continues from it
+            session.rollback()
             job.status = "error"
             job.error_msg = str(e)
             job.updated_at = datetime.utcnow()
             session.commit()
-            print(f"Error processing media for job {job_id}: {e}")
+            print(f"Error processing media for job {job_id} (checkpoint sample {job.checkpoint_sample}): {e}")
+
+@app.get("/models")
+def get_models():
+    return registry.status()
+
+@app.get("/queue")
+def get_queue():
+    return worker_pool.status()
 
 @app.get("/job/{job_id}")
 def get_job(job_id: int, session: Session = Depends(get_session)):
@@ -188,6 +240,27 @@ def get_job(job_id: int, session: Session = Depends(get_session)):
         raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
     return job
 
+@app.post("/job/{job_id}/resume")
+def resume_job(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(AudioJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status != "error":
+        raise HTTPException(status_code=400, detail=f"Job {job_id} is {job.status}; only failed jobs can be resumed")
+    # Re-queue it; the worker continues from job.checkpoint_sample
+    job.status = "pending"
+    job.error_msg = None
+    job.attempts = 0
+    job.updated_at = datetime.utcnow()
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        existing = find_identical_job(session, job.fingerprint, ACTIVE_JOB_STATUSES)
+        raise HTTPException(status_code=409, detail=f"An identical job ({existing.id if existing else 'unknown'}) "
+                                                    f"is already queued or running")
+    return {"job_id": job.id, "status": job.status, "checkpoint_sample": job.checkpoint_sample}
+
 @app.get("/transcripts/{job_id}")
 def get_transcripts(job_id: int, session: Session = Depends(get_session)):
     chunks = session.exec(select(AudioTranscriptChunk).where(AudioTranscriptChunk.job_id == job_id)).all()
@@ -0,0 +1,11 @@
+"""
+Convert JSON-encoded embeddings in audiotranscriptvector.vector to float32 bytes.
+The server also runs this on startup; run it beforehand for large tables:
+    python migrate_vectors.py
+"""
+from database import engine
+from vector_codec import migrate_json_vectors
+
+if __name__ == "__main__":
+    converted = migrate_json_vectors(engine, "audiotranscriptvector")
+    print(f"Converted {converted} vectors in audiotranscriptvector")
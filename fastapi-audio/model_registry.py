@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+from transformers import pipeline
+from sentence_transformers import SentenceTransformer
+
+# Registry limits (0 disables the corresponding cap)
+MAX_RESIDENT_MODELS = int(os.getenv("MAX_RESIDENT_MODELS", "0"))
+MAX_RESIDENT_BYTES = int(os.getenv("MAX_RESIDENT_MB", "0")) * 1024 * 1024
+
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+# Model identifiers; part of job fingerprints so new weights never reuse old results
+WHISPER_MODEL_ID = "openai/whisper-tiny"
+EMBED_MODEL_ID = "all-MiniLM-L6-v2"
+MODEL_VERSION = f"{WHISPER_MODEL_ID}+{EMBED_MODEL_ID}"
+
+
+def estimate_model_bytes(obj: Any) -> int:
+    """Approximate resident size of a model from its parameters and buffers."""
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_model_bytes(item) for item in obj)
+    if isinstance(obj, torch.nn.Module):
+        tensors = list(obj.parameters()) + list(obj.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    # Wrappers such as HF pipelines keep the torch module in `.model`
+    inner = getattr(obj, "model", None)
+    if inner is not None and inner is not obj:
+        return estimate_model_bytes(inner)
+    return 0
+
+
+class ModelRegistry:
+    """
+    Thread-safe, lazily populated registry of ML models shared by all jobs.
+    Models are loaded on first use and evicted least-recently-used first once
+    the resident count or estimated memory exceeds the configured caps.
+    """
+
+    def __init__(self, max_models: int = MAX_RESIDENT_MODELS, max_bytes: int = MAX_RESIDENT_BYTES):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+            self._stats.setdefault(name, {"loads": 0, "hits": 0, "evictions": 0})
+
+    def get(self, name: str) -> Any:
+        with self._lock:
+            if name not in self._loaders:
+                raise KeyError(f"Unknown model: {name}")
+            if name in self._models:
+                return self._hit_locked(name)
+            load_lock = self._load_locks[name]
+
+        # Load outside the registry lock so other models stay available;
+        # the per-model lock stops two threads loading the same weights.
+        with load_lock:
+            with self._lock:
+                if name in self._models:
+                    return self._hit_locked(name)
+            start = time.perf_counter()
+            model = self._loaders[name]()
+            load_seconds = time.perf_counter() - start
+            size_bytes = estimate_model_bytes(model)
+            with self._lock:
+                self._models[name] = model
+                stats = self._stats[name]
+                stats["loads"] += 1
+                stats["load_seconds"] = round(load_seconds, 3)
+                stats["size_bytes"] = size_bytes
+                stats["loaded_at"] = datetime.utcnow().isoformat()
+                stats["last_used"] = stats["loaded_at"]
+                self._evict_locked(keep=name)
+            print(f"Loaded model '{name}' in {load_seconds:.2f}s ({size_bytes / 1e6:.1f} MB)")
+            return model
+
+    def _hit_locked(self, name: str) -> Any:
+        self._models.move_to_end(name)
+        self._stats[name]["hits"] += 1
+        self._stats[name]["last_used"] = datetime.utcnow().isoformat()
+        return self._models[name]
+
+    def _resident_bytes_locked(self) -> int:
+        return sum(self._stats[name].get("size_bytes", 0) for name in self._models)
+
+    def _evict_locked(self, keep: str) -> None:
+        while len(self._models) > 1:
+            over_count = self.max_models and len(self._models) > self.max_models
+            over_bytes = self.max_bytes and self._resident_bytes_locked() > self.max_bytes
+            if not (over_count or over_bytes):
+                break
+            victim = next(iter(self._models))
+            if victim == keep:
+                break
+            del self._models[victim]
+            self._stats[victim]["evictions"] += 1
+            print(f"Evicted model '{victim}' from registry")
+        if DEVICE == "cuda":
+            torch.cuda.empty_cache()
+
+    def warm_up(self, names: Optional[List[str]] = None) -> None:
+        for name in names or list(self._loaders):
+            self.get(name)
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            models = []
+            for name in self._loaders:
+                entry = {"name": name, "loaded": name in self._models}
+                entry.update(self._stats[name])
+                models.append(entry)
+            return {
+                "device": DEVICE,
+                "max_models": self.max_models,
+                "max_bytes": self.max_bytes,
+                "resident_models": len(self._models),
+                "resident_bytes": self._resident_bytes_locked(),
+                "models": models,
+            }
+
+
+def load_whisper():
+    return pipeline("automatic-speech-recognition", model=WHISPER_MODEL_ID, device=0 if DEVICE == "cuda" else -1)
+
+
+def load_embedder():
+    return SentenceTransformer(EMBED_MODEL_ID, device=DEVICE)
+
+
+registry = ModelRegistry()
+registry.register("whisper", load_whisper)
+registry.register("embedder", load_embedder)
@@ -1,15 +1,35 @@
 from typing import Optional, List
+from sqlalchemy import Index, text
 from sqlmodel import SQLModel, Field, Relationship
 from datetime import datetime
 import json
 
+# Statuses of queued or running jobs; the database allows one such job per fingerprint
+ACTIVE_JOB_STATUSES = ("pending", "processing")
+_ACTIVE_JOB_FILTER = text("status IN ('pending', 'processing')")
+
 class AudioJob(SQLModel, table=True):
+    __table_args__ = (
+        # Keeps identical submissions to different API processes from queueing two jobs
+        Index("ux_audiojob_active_fingerprint", "fingerprint", unique=True,
+              postgresql_where=_ACTIVE_JOB_FILTER, sqlite_where=_ACTIVE_JOB_FILTER),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     file_name: str  # e.g., "example.mp3" or "example.mp4"
     media_name: str  # e.g., "example"
-    status: str = "pending"
+    settings: Optional[str] = None  # JSON-encoded processing options (duration)
+    status: str = Field(default="pending", index=True)
+    priority: int = 0  # higher-priority pending jobs are claimed first
+    attempts: int = 0  # times a worker has claimed the job
+    worker_id: Optional[str] = None  # "host:pid" of the worker running the job
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None  # refreshed while running; stale means the worker died
+    checkpoint_sample: int = 0  # audio samples transcribed and committed; resuming continues here
     result_json_path: Optional[str] = None
     error_msg: Optional[str] = None
+    fingerprint: Optional[str] = Field(default=None, index=True)  # hash of source, duration, settings and models
+    vad_skip_ratio: Optional[float] = None  # Share of the processed audio without detected speech
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     updated_at: Optional[datetime] = Field(default=None, nullable=True)
 
@@ -32,7 +52,8 @@ class AudioTranscriptVector(SQLModel, table=True):
     job_id: int = Field(foreign_key="audiojob.id")
     chunk_id: int = Field(foreign_key="audiotranscriptchunk.id")
     chunk_index: int
-    vector: str  # JSON-encoded embedding
+    vector: bytes  # embedding bytes in vector_dtype format (see vector_codec)
+    vector_dtype: str = "float32"  # "float32", "float16" or "int8"
     transcript: str
 
     job: Optional[AudioJob] = Relationship(back_populates="transcript_vectors")
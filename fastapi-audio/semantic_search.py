@@ -1,67 +1,130 @@
+from sqlalchemy import func
 from sqlmodel import Session, select
 from database import engine
 from models import AudioTranscriptChunk, AudioTranscriptVector
-from sentence_transformers import SentenceTransformer
+from model_registry import registry
+from bulk_writer import BulkWriter
+from vector_codec import encode_vector, decode_matrix, VECTOR_PRECISION
 import numpy as np
-from typing import List, Dict
-import json
+import threading
+from collections import OrderedDict
+import os
+from typing import List, Dict, Tuple
+
+# Transcripts per SentenceTransformer encode call
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Normalised embedding matrices of recently searched jobs (job_id -> (version, chunk_ids, matrix))
+MAX_CACHED_JOBS = 32
+_job_matrices: "OrderedDict[int, Tuple[Tuple[int, int], np.ndarray, np.ndarray]]" = OrderedDict()
+_job_matrices_lock = threading.Lock()
 
 def generate_transcript_embeddings(job_id: int, session: Session) -> None:
     """
-    Generate embeddings for all transcript chunks of a job and store in AudioTranscriptVector.
+    Generate embeddings for the transcript chunks of a job that have none yet and store
+    them in AudioTranscriptVector, so a resumed job does not embed its chunks twice.
+    Transcripts are encoded EMBED_BATCH_SIZE at a time and stored in VECTOR_PRECISION format.
     """
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    embedded = select(AudioTranscriptVector.chunk_id).where(AudioTranscriptVector.job_id == job_id)
     chunks = session.exec(
-        select(AudioTranscriptChunk).where(AudioTranscriptChunk.job_id == job_id)
+        select(AudioTranscriptChunk)
+        .where(AudioTranscriptChunk.job_id == job_id, AudioTranscriptChunk.id.not_in(embedded))
     ).all()
-    
-    for chunk in chunks:
-        # Skip empty transcripts
-        if not chunk.transcript or chunk.transcript.strip() == "":
-            continue
-        embedding = model.encode(chunk.transcript).tolist()
-        vector_record = AudioTranscriptVector(
-            job_id=chunk.job_id,
-            chunk_id=chunk.id,
-            chunk_index=chunk.chunk_index,
-            vector=json.dumps(embedding),
-            transcript=chunk.transcript
-        )
-        session.add(vector_record)
+    # Skip empty transcripts
+    chunks = [chunk for chunk in chunks if chunk.transcript and chunk.transcript.strip()]
+    if not chunks:
+        return
+
+    model = registry.get("embedder")
+    embeddings = model.encode([chunk.transcript for chunk in chunks], batch_size=EMBED_BATCH_SIZE,
+                              convert_to_numpy=True)
+    vector_rows = [
+        {
+            "job_id": chunk.job_id,
+            "chunk_id": chunk.id,
+            "chunk_index": chunk.chunk_index,
+            "vector": encode_vector(embedding, VECTOR_PRECISION),
+            "vector_dtype": VECTOR_PRECISION,
+            "transcript": chunk.transcript
+        }
+        for chunk, embedding in zip(chunks, embeddings)
+    ]
+    BulkWriter(session).insert(AudioTranscriptVector, vector_rows, returning=False)
     session.commit()
 
+def load_job_matrix(session: Session, job_id: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return (chunk_ids, matrix) for a job, where matrix holds the job's embeddings as
+    unit-normalised float32 rows. Matrices are cached per job so repeat searches
+    only pay for one matrix-vector product. Embeddings are written by job worker
+    processes, so a cached matrix is reused only while the job's vector count and
+    highest vector id in the database still match it.
+    """
+    version = tuple(session.exec(
+        select(func.count(AudioTranscriptVector.id), func.coalesce(func.max(AudioTranscriptVector.id), 0))
+        .where(AudioTranscriptVector.job_id == job_id)
+    ).one())
+    with _job_matrices_lock:
+        cached = _job_matrices.get(job_id)
+        if cached is not None and cached[0] == version:
+            _job_matrices.move_to_end(job_id)
+            return cached[1], cached[2]
+
+    rows = session.exec(
+        select(AudioTranscriptVector.chunk_id, AudioTranscriptVector.vector, AudioTranscriptVector.vector_dtype)
+        .where(AudioTranscriptVector.job_id == job_id)
+    ).all()
+    chunk_ids = np.fromiter((chunk_id for chunk_id, _, _ in rows), dtype=np.int64, count=len(rows))
+    matrix = decode_matrix([vector for _, vector, _ in rows], [dtype for _, _, dtype in rows]).copy()
+    if len(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+
+    with _job_matrices_lock:
+        _job_matrices[job_id] = (version, chunk_ids, matrix)
+        _job_matrices.move_to_end(job_id)
+        while len(_job_matrices) > MAX_CACHED_JOBS:
+            _job_matrices.popitem(last=False)
+    return chunk_ids, matrix
+
 def semantic_search(query: str, job_id: int, top_k: int = 5) -> List[Dict]:
     """
     Perform semantic search over transcript chunks for a job using a query string.
     Returns the top_k most similar chunks with their metadata.
     """
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    query_embedding = model.encode(query)
+    model = registry.get("embedder")
+    query_embedding = model.encode(query, convert_to_numpy=True).astype(np.float32)
+    query_embedding /= np.linalg.norm(query_embedding) or 1.0
 
     with Session(engine) as session:
-        vectors = session.exec(
-            select(AudioTranscriptVector).where(AudioTranscriptVector.job_id == job_id)
-        ).all()
-        
-        if not vectors:
+        chunk_ids, matrix = load_job_matrix(session, job_id)
+        if not len(chunk_ids) or top_k <= 0:
             return []
 
-        # Compute cosine similarities
+        # Cosine similarity of every chunk in one product, then partial sort for top_k
+        similarities = matrix @ query_embedding
+        k = min(top_k, len(similarities))
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+
+        # Hydrate only the top_k chunks, in one query
+        top_chunk_ids = [int(chunk_ids[i]) for i in top]
+        chunks = {
+            chunk.id: chunk for chunk in session.exec(
+                select(AudioTranscriptChunk).where(AudioTranscriptChunk.id.in_(top_chunk_ids))
+            ).all()
+        }
         results = []
-        for vector in vectors:
-            vector_array = np.array(json.loads(vector.vector))
-            similarity = np.dot(query_embedding, vector_array) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(vector_array)
-            )
+        for i, chunk_id in zip(top, top_chunk_ids):
+            chunk = chunks.get(chunk_id)
+            if chunk is None:
+                continue
             results.append({
-                "chunk_id": vector.chunk_id,
-                "chunk_index": vector.chunk_index,
-                "transcript": vector.transcript,
-                "similarity": float(similarity),
-                "start_time": session.get(AudioTranscriptChunk, vector.chunk_id).start_time,
-                "end_time": session.get(AudioTranscriptChunk, vector.chunk_id).end_time
+                "chunk_id": chunk_id,
+                "chunk_index": chunk.chunk_index,
+                "transcript": chunk.transcript,
+                "similarity": float(similarities[i]),
+                "start_time": chunk.start_time,
+                "end_time": chunk.end_time
             })
-
-        # Sort by similarity and return top_k
-        results = sorted(results, key=lambda x: x["similarity"], reverse=True)[:top_k]
-        return results
\ No newline at end of file
+        return results
@@ -0,0 +1,91 @@
+import numpy as np
+
+from transcription import stitch_words, transcribe_windows, with_context
+
+
+def word(text, start, end):
+    return {"text": text, "timestamp": (start, end)}
+
+
+def test_stitch_words_keeps_words_with_midpoint_in_window():
+    result = {"chunks": [word(" cut", 0.6, 1.3), word(" hello", 1.4, 1.9), word(" world", 5.7, 6.4),
+                         word(" next", 6.1, 6.6)]}
+    # Window is [1.0, 6.0) of the padded audio: " cut" (midpoint 0.95) belongs to the previous
+    # window, " world" (midpoint 6.05) to the next one
+    assert stitch_words(result, 1.0, 6.0) == "hello"
+    assert stitch_words(result, 0.0, 1.0) == "cut"
+    assert stitch_words(result, 6.0, 7.0) == "world next"
+
+
+def test_stitch_words_handles_missing_timestamps():
+    result = {"chunks": [word(" a", None, None), word(" b", 2.0, None), word(" c", 3.0, 3.5)]}
+    assert stitch_words(result, 0.0, 5.0) == "b c"
+    assert stitch_words({}, 0.0, 5.0) == ""
+
+
+def windows(count, size=10, gap_after=None):
+    start = 0
+    result = []
+    for i in range(count):
+        result.append((start, np.full(size, i, dtype=np.float32)))
+        start += size + (5 if i == gap_after else 0)
+    return result
+
+
+def test_with_context_pads_contiguous_neighbours():
+    padded = list(with_context(windows(3), overlap_samples=3))
+    assert [(start, length, left) for start, length, _, left in padded] == [(0, 10, 0), (10, 10, 3), (20, 10, 3)]
+    np.testing.assert_array_equal(padded[0][2], [0] * 10 + [1] * 3)
+    np.testing.assert_array_equal(padded[1][2], [0] * 3 + [1] * 10 + [2] * 3)
+    np.testing.assert_array_equal(padded[2][2], [1] * 3 + [2] * 10)
+
+
+def test_with_context_skips_neighbours_across_gaps():
+    padded = list(with_context(windows(3, gap_after=0), overlap_samples=3))
+    assert len(padded[0][2]) == 10 and padded[1][3] == 0
+    np.testing.assert_array_equal(padded[1][2], [1] * 10 + [2] * 3)
+
+
+def test_with_context_without_overlap():
+    padded = list(with_context(windows(2), overlap_samples=0))
+    assert all(len(audio) == 10 and left == 0 for _, _, audio, left in padded)
+
+
+class FakeTranscriber:
+    """Transcribes each run of equal samples (one per window, see windows()) as one word."""
+
+    def __init__(self, fail_batches=False):
+        self.calls = []
+        self.fail_batches = fail_batches
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        batch = inputs if isinstance(inputs, list) else [inputs]
+        self.calls.append(len(batch))
+        if self.fail_batches and len(batch) > 1:
+            raise RuntimeError("out of memory")
+        results = []
+        for item in batch:
+            audio, rate = item["raw"], item["sampling_rate"]
+            starts = np.flatnonzero(np.diff(audio, prepend=np.nan))
+            ends = np.append(starts[1:], len(audio))
+            words = [word(f" w{int(audio[start])}", start / rate, end / rate) for start, end in zip(starts, ends)]
+            results.append({"text": "".join(w["text"] for w in words), "chunks": words})
+        return results if isinstance(inputs, list) else results[0]
+
+
+def test_transcribe_windows_batches_in_order():
+    transcriber = FakeTranscriber()
+    batches = list(transcribe_windows(transcriber, windows(5, size=16), sample_rate=16, batch_size=2,
+                                      overlap_seconds=0.25))
+    assert transcriber.calls == [2, 2, 1]
+    flat = [item for batch in batches for item in batch]
+    assert flat == [(0, 16, "w0"), (16, 16, "w1"), (32, 16, "w2"), (48, 16, "w3"), (64, 16, "w4")]
+
+
+def test_transcribe_windows_retries_failed_batch_one_window_at_a_time():
+    transcriber = FakeTranscriber(fail_batches=True)
+    batches = list(transcribe_windows(transcriber, windows(3, size=16), sample_rate=16, batch_size=3,
+                                      overlap_seconds=0))
+    assert transcriber.calls == [3, 1, 1, 1]
+    # Without overlap the plain text is used
+    assert [text for _, _, text in batches[0]] == ["w0", "w1", "w2"]
@@ -0,0 +1,99 @@
+import numpy as np
+
+from vad import speech_segments
+
+RATE = 16000
+
+
+def tone(seconds, amplitude=0.3):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (amplitude * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+
+def windows(audio, seconds=5, start=0):
+    size = seconds * RATE
+    return [(start + offset, audio[offset:offset + size]) for offset in range(0, len(audio), size)]
+
+
+def segments(audio, **kwargs):
+    kwargs.setdefault("sample_rate", RATE)
+    kwargs.setdefault("threshold_db", -40)
+    kwargs.setdefault("frame_ms", 30)
+    kwargs.setdefault("min_speech_ms", 250)
+    kwargs.setdefault("min_silence_ms", 500)
+    kwargs.setdefault("pad_ms", 200)
+    kwargs.setdefault("max_segment_seconds", 10)
+    return list(speech_segments(windows(audio, kwargs.pop("window_seconds", 5)), **kwargs))
+
+
+def spans(result):
+    return [(start / RATE, (start + len(audio)) / RATE) for start, audio in result]
+
+
+def test_silence_yields_nothing():
+    assert segments(silence(12)) == []
+
+
+def test_speech_is_found_and_padded():
+    result = segments(np.concatenate([silence(2), tone(3), silence(3)]))
+    assert len(result) == 1
+    (start, end), = spans(result)
+    assert 1.75 <= start <= 1.85
+    assert 5.15 <= end <= 5.25
+
+
+def test_segment_audio_matches_input():
+    audio = np.concatenate([silence(2), tone(3), silence(3)])
+    start, segment = segments(audio)[0]
+    np.testing.assert_array_equal(segment, audio[start:start + len(segment)])
+
+
+def test_short_pause_does_not_split():
+    result = segments(np.concatenate([silence(1), tone(1), silence(0.3), tone(1), silence(2)]))
+    assert len(result) == 1
+
+
+def test_long_pause_splits_without_overlap():
+    result = segments(np.concatenate([silence(1), tone(1), silence(2), tone(1), silence(2)]))
+    assert len(result) == 2
+    (_, first_end), (second_start, _) = spans(result)
+    assert first_end <= second_start
+
+
+def test_clicks_are_ignored():
+    assert segments(np.concatenate([silence(1), tone(0.1), silence(2)])) == []
+
+
+def test_long_speech_is_split_into_contiguous_pieces():
+    result = segments(np.concatenate([silence(1), tone(25), silence(1)]), max_segment_seconds=10)
+    pieces = spans(result)
+    assert len(pieces) == 3
+    assert [len(audio) for _, audio in result][:2] == [10 * RATE, 10 * RATE]
+    assert all(previous[1] == following[0] for previous, following in zip(pieces, pieces[1:]))
+
+
+def test_split_inside_a_pause_emits_no_empty_segment():
+    # The 10 s split lands in the pause after the speech, before the pause is long enough to end it
+    result = segments(np.concatenate([silence(1), tone(9.45), silence(2)]), max_segment_seconds=10)
+    assert [len(audio) for _, audio in result] == [10 * RATE]
+
+
+def test_results_do_not_depend_on_window_size():
+    audio = np.concatenate([silence(1.3), tone(2.2), silence(1.1), tone(0.7), silence(3)])
+    assert spans(segments(audio, window_seconds=5)) == spans(segments(audio, window_seconds=1))
+
+
+def test_offsets_are_absolute():
+    audio = np.concatenate([silence(2), tone(3), silence(3)])
+    start, _ = list(speech_segments(windows(audio, start=RATE * 60), sample_rate=RATE))[0]
+    assert start == segments(audio)[0][0] + RATE * 60
+
+
+def test_speech_until_the_end_is_flushed():
+    result = segments(np.concatenate([silence(1), tone(2)]))
+    (start, end), = spans(result)
+    assert end == 3.0
@@ -0,0 +1,114 @@
+import os
+from typing import Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+# Windows transcribed per Whisper forward pass (1 = one call per window)
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "8"))
+# Audio from each neighbouring window added on both sides of a window, in seconds.
+# Words are assigned to the window containing their midpoint, so a word cut by a
+# window boundary is transcribed whole and kept exactly once (0 disables).
+WHISPER_OVERLAP_SECONDS = float(os.getenv("WHISPER_OVERLAP_SECONDS", "1.0"))
+# Length of the audio windows (and transcript chunks) fed to Whisper, in seconds
+WINDOW_SECONDS = 5
+
+# Settings that change the transcripts of a job; part of its fingerprint
+TRANSCRIBE_CONFIG = {
+    "window_seconds": WINDOW_SECONDS, "overlap_seconds": WHISPER_OVERLAP_SECONDS, "batch_size": WHISPER_BATCH_SIZE,
+}
+
+
+def with_context(windows: Iterable[Tuple[int, np.ndarray]], overlap_samples: int
+                 ) -> Iterator[Tuple[int, int, np.ndarray, int]]:
+    """
+    Pad each window with up to overlap_samples of audio from the previous and next
+    windows where they are contiguous with it (VAD segments may have gaps between).
+    Yields (start_sample, num_samples, padded_audio, left_padding). Looks one
+    window ahead; memory stays bounded by three windows.
+    """
+    previous = None
+    pending = None
+    for window in windows:
+        if pending is not None:
+            yield _pad(previous, pending, window, overlap_samples)
+            previous = pending
+        pending = window
+    if pending is not None:
+        yield _pad(previous, pending, None, overlap_samples)
+
+
+def _pad(previous, current, following, overlap_samples: int) -> Tuple[int, int, np.ndarray, int]:
+    start_sample, audio = current
+    # Only neighbours that directly adjoin the window (no skipped audio between) give context
+    if previous is None or not overlap_samples or previous[0] + len(previous[1]) != start_sample:
+        left = audio[:0]
+    else:
+        left = previous[1][-overlap_samples:]
+    if following is None or not overlap_samples or following[0] != start_sample + len(audio):
+        right = audio[:0]
+    else:
+        right = following[1][:overlap_samples]
+    return start_sample, len(audio), np.concatenate([left, audio, right]), len(left)
+
+
+def stitch_words(result: dict, start_seconds: float, end_seconds: float) -> str:
+    """Join the words of a padded window's result whose midpoint lies in [start_seconds, end_seconds)."""
+    words = []
+    for word in result.get("chunks") or []:
+        word_start, word_end = word["timestamp"]
+        if word_start is None:
+            continue
+        midpoint = (word_start + (word_end if word_end is not None else word_start)) / 2
+        if start_seconds <= midpoint < end_seconds:
+            words.append(word["text"])
+    return "".join(words).strip()
+
+
+def _transcribe(transcriber, batch, sample_rate: int, word_timestamps: bool) -> List[dict]:
+    inputs = [{"raw": audio, "sampling_rate": sample_rate} for _, _, audio, _ in batch]
+    kwargs = {"return_timestamps": "word"} if word_timestamps else {}
+    if len(inputs) == 1:
+        return [transcriber(inputs[0], **kwargs)]
+    return transcriber(inputs, batch_size=len(inputs), **kwargs)
+
+
+def transcribe_windows(transcriber, windows: Iterable[Tuple[int, np.ndarray]], sample_rate: int,
+                       batch_size: int = WHISPER_BATCH_SIZE, overlap_seconds: float = WHISPER_OVERLAP_SECONDS
+                       ) -> Iterator[List[Tuple[int, int, str]]]:
+    """
+    Transcribe consecutive audio windows batch_size at a time, each padded with
+    overlap_seconds of context, and yield one list of (start_sample, num_samples,
+    transcript) per batch in window order. A batch that fails is retried one
+    window at a time; windows that still fail get an empty transcript.
+    """
+    overlap_samples = int(overlap_seconds * sample_rate)
+    word_timestamps = overlap_samples > 0
+    batch = []
+
+    def finish(batch):
+        try:
+            results = _transcribe(transcriber, batch, sample_rate, word_timestamps)
+        except Exception as e:
+            if len(batch) == 1:
+                print(f"Transcription failed for window at sample {batch[0][0]}: {e}")
+                results = [{}]
+            else:
+                print(f"Batched transcription failed ({e}); retrying {len(batch)} windows one at a time")
+                return [item for window in batch for item in finish([window])]
+        transcripts = []
+        for (start_sample, num_samples, _, left_padding), result in zip(batch, results):
+            if word_timestamps:
+                window_start = left_padding / sample_rate
+                transcript = stitch_words(result, window_start, window_start + num_samples / sample_rate)
+            else:
+                transcript = (result.get("text") or "").strip()
+            transcripts.append((start_sample, num_samples, transcript))
+        return transcripts
+
+    for window in with_context(windows, overlap_samples):
+        batch.append(window)
+        if len(batch) >= max(1, batch_size):
+            yield finish(batch)
+            batch = []
+    if batch:
+        yield finish(batch)
@@ -0,0 +1,98 @@
+import math
+import os
+from typing import Iterable, Iterator, Tuple
+
+import numpy as np
+
+from audio_stream import SAMPLE_RATE
+
+# "energy": transcribe only speech segments found by frame energy; "off": fixed 5-second windows
+VAD_MODE = os.getenv("VAD_MODE", "energy")
+# Frames at or above this level (dBFS, RMS over VAD_FRAME_MS) count as speech
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "-40"))
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+# Speech shorter than VAD_MIN_SPEECH_MS is ignored (clicks); pauses shorter than
+# VAD_MIN_SILENCE_MS don't end a segment; segments keep VAD_PAD_MS of audio on each side
+VAD_MIN_SPEECH_MS = int(os.getenv("VAD_MIN_SPEECH_MS", "250"))
+VAD_MIN_SILENCE_MS = int(os.getenv("VAD_MIN_SILENCE_MS", "500"))
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "200"))
+# Longer speech is split into contiguous segments of at most this length
+VAD_MAX_SEGMENT_SECONDS = float(os.getenv("VAD_MAX_SEGMENT_SECONDS", "10"))
+
+if VAD_MODE not in ("energy", "off"):
+    raise ValueError(f"VAD_MODE must be energy or off, not {VAD_MODE!r}")
+
+# Settings that change which audio is transcribed; part of job fingerprints
+VAD_CONFIG = {"mode": VAD_MODE} if VAD_MODE == "off" else {
+    "mode": VAD_MODE, "threshold_db": VAD_THRESHOLD_DB, "frame_ms": VAD_FRAME_MS,
+    "min_speech_ms": VAD_MIN_SPEECH_MS, "min_silence_ms": VAD_MIN_SILENCE_MS, "pad_ms": VAD_PAD_MS,
+    "max_segment_seconds": VAD_MAX_SEGMENT_SECONDS,
+}
+
+
+def speech_segments(windows: Iterable[Tuple[int, np.ndarray]], sample_rate: int = SAMPLE_RATE,
+                    threshold_db: float = VAD_THRESHOLD_DB, frame_ms: int = VAD_FRAME_MS,
+                    min_speech_ms: int = VAD_MIN_SPEECH_MS, min_silence_ms: int = VAD_MIN_SILENCE_MS,
+                    pad_ms: int = VAD_PAD_MS, max_segment_seconds: float = VAD_MAX_SEGMENT_SECONDS
+                    ) -> Iterator[Tuple[int, np.ndarray]]:
+    """
+    Energy-based voice activity detection over streamed (start_sample, audio) windows.
+    Yields (start_sample, audio) for each speech segment, padded by pad_ms and split
+    into contiguous pieces of at most max_segment_seconds. Silence is dropped, and
+    only the current segment is buffered.
+    """
+    frame = max(1, int(sample_rate * frame_ms / 1000))
+    pad = int(sample_rate * pad_ms / 1000)
+    min_speech_frames = max(1, math.ceil(min_speech_ms / frame_ms))
+    min_silence = int(sample_rate * min_silence_ms / 1000)
+    max_segment = max(frame, int(sample_rate * max_segment_seconds))
+
+    buffer = np.zeros(0, dtype=np.float32)
+    buffer_start = None  # absolute sample of buffer[0]
+    position = 0  # absolute sample of the next frame to classify
+    emitted_until = 0  # segments never start before the end of the previous one
+    segment_start = None
+    speech_run = 0
+    last_speech_end = 0
+
+    def cut(start: int, end: int) -> Tuple[int, np.ndarray]:
+        return start, buffer[start - buffer_start:end - buffer_start].copy()
+
+    for start_sample, audio in windows:
+        if buffer_start is None:
+            buffer_start = position = emitted_until = start_sample
+        buffer = np.concatenate([buffer, audio])
+        buffer_end = buffer_start + len(buffer)
+
+        while position + frame <= buffer_end:
+            samples = buffer[position - buffer_start:position - buffer_start + frame]
+            level_db = 10 * math.log10(float(np.mean(samples * samples)) + 1e-10)
+            frame_end = position + frame
+            if level_db >= threshold_db:
+                speech_run += 1
+                last_speech_end = frame_end
+                if segment_start is None and speech_run >= min_speech_frames:
+                    segment_start = max(frame_end - speech_run * frame - pad, emitted_until, buffer_start)
+            else:
+                speech_run = 0
+                if segment_start is not None and frame_end - last_speech_end >= min_silence:
+                    # A split inside the pause may already have emitted the padding
+                    segment_end = max(min(last_speech_end + pad, frame_end), segment_start)
+                    if segment_end > segment_start:
+                        yield cut(segment_start, segment_end)
+                    emitted_until, segment_start = segment_end, None
+            if segment_start is not None and frame_end - segment_start >= max_segment:
+                split = segment_start + max_segment
+                yield cut(segment_start, split)
+                emitted_until = segment_start = split
+            position = frame_end
+
+        # Keep the open segment, or enough audio to pad the start of the next one
+        keep_from = segment_start if segment_start is not None else max(
+            buffer_start, emitted_until, position - speech_run * frame - pad
+        )
+        buffer = buffer[keep_from - buffer_start:]
+        buffer_start = keep_from
+
+    if segment_start is not None and buffer_start + len(buffer) > segment_start:
+        yield cut(segment_start, buffer_start + len(buffer))
@@ -0,0 +1,58 @@
+"""
+Audio job workers: claim pending AudioJob rows and run process_audio outside the
+web server. Run this next to the API (with EMBEDDED_WORKERS=0 on the API) to scale
+workers separately from HTTP replicas.
+
+Usage:
+    python worker.py                # AUDIO_WORKERS processes (default 1)
+    python worker.py --workers 4
+"""
+import argparse
+import json
+import os
+
+from sqlmodel import Session
+
+from database import create_db_and_tables, engine
+from job_queue import WorkerPool, worker_loop
+from models import AudioJob
+
+# Concurrent transcription jobs (each worker process loads its own Whisper/embedder)
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", "1"))
+# Start AUDIO_WORKERS worker processes from the API process itself
+EMBEDDED_WORKERS = os.getenv("EMBEDDED_WORKERS", "1") == "1"
+
+
+def run_audio_job(job_id: int) -> None:
+    # Imported here so only worker processes load the models
+    from main import process_audio
+
+    with Session(engine) as session:
+        job = session.get(AudioJob, job_id)
+        file_name, media_name = job.file_name, job.media_name
+        settings = json.loads(job.settings or "{}")
+    media_path = os.path.join("..", "contents", "media", file_name)
+    process_audio(job_id, media_path, media_name, settings.get("duration"))
+
+
+def audio_worker(stop) -> None:
+    worker_loop(AudioJob, run_audio_job, stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=AUDIO_WORKERS)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    os.makedirs("../contents/media", exist_ok=True)
+    pool = WorkerPool(AudioJob, audio_worker, args.workers, name="audio-worker")
+    pool.start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()
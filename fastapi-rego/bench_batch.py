@@ -0,0 +1,124 @@
+"""
+Benchmark /chat/batch against the same number of serial /chat calls. Starts the
+API in-process with uvicorn, pointed at the stub OPA server from
+bench_decisions.py (or a local OPA server with --opa-host). The decision cache is
+cleared before each run so both paths query OPA for every distinct input; the
+OPA queries column shows how many each path actually made.
+
+Usage:
+    python bench_batch.py --checks 1000
+    python bench_batch.py --checks 1000 --distinct 50 --opa-host http://localhost:8181
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+import requests
+import uvicorn
+
+from bench_decisions import start_stub
+
+REGIONS = ["us", "eu", "apac", "latam"]
+
+
+def make_queries(checks: int, distinct: int) -> list:
+    return [
+        f"Check access for product mediacomposer with region {REGIONS[i % len(REGIONS)]}, usage 1 TB, "
+        f"License Avid Platinum, seat {i % distinct}"
+        for i in range(checks)
+    ]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_api(port: int):
+    from main import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def run_serial(session: requests.Session, url: str, queries: list) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        session.post(f"{url}/chat", json={"query": query}).raise_for_status()
+    return time.perf_counter() - start
+
+
+def run_batch(session: requests.Session, url: str, queries: list):
+    start = time.perf_counter()
+    first = None
+    results = []
+    with session.post(f"{url}/chat/batch", json={"queries": queries}, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                first = first or time.perf_counter() - start
+                results.append(json.loads(line))
+    elapsed = time.perf_counter() - start
+    errors = [result for result in results if "error" in result]
+    if len(results) != len(queries) or errors:
+        raise SystemExit(f"Batch returned {len(results)} results for {len(queries)} queries, {len(errors)} errors")
+    return elapsed, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--checks", type=int, default=1000)
+    parser.add_argument("--distinct", type=int, default=None, help="distinct inputs among the checks (default: all)")
+    parser.add_argument("--compile-ms", type=float, default=5.0, help="stub only: simulated compile time per upload")
+    parser.add_argument("--opa-host", default=None, help="use this OPA server instead of the stub")
+    args = parser.parse_args()
+
+    logging.disable(logging.ERROR)
+    stub = None
+    if args.opa_host is None:
+        stub = start_stub(args.compile_ms)
+        args.opa_host = f"http://127.0.0.1:{stub.server_port}"
+    # main reads OPA_HOST at import
+    os.environ["OPA_HOST"] = args.opa_host
+    port = free_port()
+    server = start_api(port)
+    from main import rego_service
+
+    url = f"http://127.0.0.1:{port}"
+    queries = make_queries(args.checks, args.distinct or args.checks)
+    session = requests.Session()
+    session.post(f"{url}/chat", json={"query": queries[0]}).raise_for_status()  # warm-up
+
+    def opa_queries() -> int:
+        return rego_service.latency_stats()["backends"][rego_service.backend]["calls"]
+
+    rego_service.decisions.clear()
+    before = opa_queries()
+    serial = run_serial(session, url, queries)
+    serial_queries = opa_queries() - before
+    rego_service.decisions.clear()
+    before = opa_queries()
+    batch, first_result = run_batch(session, url, queries)
+    batch_queries = opa_queries() - before
+
+    print(f"opa={args.opa_host}{' (stub)' if stub else ''} checks={args.checks} "
+          f"distinct={args.distinct or args.checks}")
+    print(f"{'mode':<16}{'seconds':>10}{'checks/sec':>12}{'speedup':>10}{'OPA queries':>13}")
+    print(f"{'serial /chat':<16}{serial:>10.3f}{args.checks / serial:>12.1f}{1.0:>10.2f}{serial_queries:>13}")
+    print(f"{'/chat/batch':<16}{batch:>10.3f}{args.checks / batch:>12.1f}{serial / batch:>10.2f}{batch_queries:>13}")
+    print(f"first batch result after {1000 * first_result:.1f} ms")
+
+    server.should_exit = True
+    if stub is not None:
+        stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
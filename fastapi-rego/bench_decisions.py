@@ -0,0 +1,134 @@
+"""
+Benchmark /chat decision throughput: re-reading and re-uploading the policy on
+every decision (the old path) vs. the cached path that uploads only on change,
+and repeated inputs answered from the decision cache.
+Runs against a local OPA binary (--opa-host) or a built-in stub OPA server
+that sleeps --compile-ms on every policy upload to stand in for compilation.
+
+Usage:
+    python bench_decisions.py --decisions 500 --compile-ms 5
+    python bench_decisions.py --decisions 2000 --opa-host http://localhost:8181   # opa run --server
+    python bench_decisions.py --decisions 500 --backend opa_client
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from rego_service import RegoService
+
+
+class StubOpaHandler(BaseHTTPRequestHandler):
+    """Minimal OPA REST API: health, policy upload and data queries that always allow."""
+    protocol_version = "HTTP/1.1"
+    # Without this, Nagle + delayed ACK stall each keep-alive response by ~40 ms
+    disable_nagle_algorithm = True
+    compile_seconds = 0.0
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {})
+        else:
+            self._reply(404, {"code": "resource_not_found"})
+
+    def do_PUT(self):
+        self._read_body()
+        time.sleep(self.compile_seconds)
+        self._reply(200, {})
+
+    def do_POST(self):
+        self._read_body()
+        self._reply(200, {"result": True})
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(compile_ms: float) -> ThreadingHTTPServer:
+    StubOpaHandler.compile_seconds = compile_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubOpaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def uncached_decision(service: RegoService, product: str, input_data: dict):
+    # Mirrors the old /chat path: read both files, upload the policy and query OPA every time
+    service.decisions.clear()
+    with open(f"{service.data_dir}/{product}.json") as f:
+        data = json.load(f)
+    with open(f"{service.policy_dir}/{product}.rego") as f:
+        service.upload_policy_to_opa(product, f.read())
+    return service.evaluate_policy(product, {**data, **input_data})
+
+
+def cached_policy_decision(service: RegoService, product: str, input_data: dict):
+    # Cached files and upload-on-change, but every decision still queries OPA
+    service.decisions.clear()
+    return cached_decision(service, product, input_data)
+
+
+def cached_decision(service: RegoService, product: str, input_data: dict):
+    data = service.load_data_file(product)
+    service.ensure_policy(product)
+    return service.evaluate_policy(product, {**data, **input_data})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--decisions", type=int, default=500)
+    parser.add_argument("--product", default="mediacomposer")
+    parser.add_argument("--compile-ms", type=float, default=5.0, help="stub only: simulated compile time per upload")
+    parser.add_argument("--opa-host", default=None, help="use this OPA server instead of the stub")
+    parser.add_argument("--backend", default="http", choices=("http", "opa_client"), help="decision query backend")
+    args = parser.parse_args()
+
+    # The service logs every decision; keep the table readable
+    logging.disable(logging.ERROR)
+    server = None
+    opa_host = args.opa_host
+    if opa_host is None:
+        server = start_stub(args.compile_ms)
+        opa_host = f"http://127.0.0.1:{server.server_port}"
+    service = RegoService(opa_host, backend=args.backend)
+    service.check_opa_health()
+    input_data = {"region": "us", "usage": "1 TB", "License": "Avid Platinum"}
+
+    print(f"opa={opa_host}{' (stub, compile ' + str(args.compile_ms) + ' ms)' if server else ''} "
+          f"decisions={args.decisions} backend={args.backend}")
+    print(f"{'mode':<20}{'decisions/sec':>15}{'ms/decision':>14}{'speedup':>10}")
+    base_rate = None
+    modes = (("upload every call", uncached_decision), ("cached policy", cached_policy_decision),
+             ("decision cache", cached_decision))
+    for name, decide in modes:
+        decide(service, args.product, input_data)  # warm-up
+        start = time.perf_counter()
+        for _ in range(args.decisions):
+            decide(service, args.product, input_data)
+        elapsed = time.perf_counter() - start
+        rate = args.decisions / elapsed
+        base_rate = base_rate or rate
+        print(f"{name:<20}{rate:>15.1f}{1000 * elapsed / args.decisions:>14.3f}{rate / base_rate:>10.2f}")
+
+    latency = service.latency_stats()["backends"][args.backend]
+    print(f"OPA queries: {latency['calls']} calls, {latency['errors']} errors, "
+          f"p50 {latency['p50_ms']:.3f} ms, p99 {latency['p99_ms']:.3f} ms")
+
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
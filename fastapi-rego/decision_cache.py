@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# Decisions kept in memory (0 disables the cache) and seconds each one stays valid
+DECISION_CACHE_SIZE = int(os.getenv("DECISION_CACHE_SIZE", "10000"))
+DECISION_CACHE_TTL = float(os.getenv("DECISION_CACHE_TTL", "300"))
+
+# Returned by DecisionCache.get on a miss (False and None are valid decisions)
+MISSING = object()
+
+DecisionKey = Tuple[str, Optional[str], Optional[str], str]
+
+
+def canonical_input(input_data: dict) -> str:
+    """JSON encoding that is identical for equal inputs regardless of key order."""
+    return json.dumps(input_data, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class DecisionCache:
+    """
+    Thread-safe TTL + LRU cache of policy decisions keyed by
+    (product, policy sha256, data sha256, canonical input).
+    """
+
+    def __init__(self, max_entries: int = DECISION_CACHE_SIZE, ttl: float = DECISION_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[DecisionKey, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: DecisionKey) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            expires_at, decision = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decision
+
+    def put(self, key: DecisionKey, decision: Any) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, decision)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, product: str) -> int:
+        """Drop every decision for product (its policy or data changed). Returns the number dropped."""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] == product]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
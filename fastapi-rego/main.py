@@ -1,15 +1,17 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+import asyncio
 import json
 import re
 import os
 import requests
-from opa_client.opa import OpaClient
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 from urllib.parse import urlparse, urljoin
 import logging
-from rego_service import RegoService
+from rego_service import RegoService, POLICY_WATCH_SECONDS
+from decision_cache import canonical_input
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -21,8 +23,14 @@ app = FastAPI(title="AI Chat API for Rego Policy Evaluation")
 class ChatQuery(BaseModel):
     query: str
 
+class ChatBatchQuery(BaseModel):
+    queries: list[str]
+
 # OPA server configuration
-OPA_HOST = "http://localhost:8181"
+OPA_HOST = os.getenv("OPA_HOST", "http://localhost:8181")
+# Largest /chat/batch request and the evaluations it may have in flight at once
+MAX_BATCH_QUERIES = int(os.getenv("MAX_BATCH_QUERIES", "10000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
 
 rego_service = RegoService(OPA_HOST)
 
@@ -62,33 +70,112 @@ async def startup_event():
     except requests.RequestException:
         raise HTTPException(status_code=500, detail=f"OPA server not available at {OPA_HOST}. Please ensure OPA is running (e.g., 'opa run --server').")
 
+    # Upload every policy once; afterwards only changed policies are uploaded
+    rego_service.sync_policies()
+    rego_service.start_watcher(POLICY_WATCH_SECONDS)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    rego_service.close()
+
+def prepare_product(product: str) -> dict:
+    """Load the product's data and make sure OPA has its current policy (blocking I/O)."""
+    # Load data file (cached until the file changes)
+    data = rego_service.load_data_file(product)
+    
+    # Upload the policy to OPA only if it changed since the last upload
+    rego_service.ensure_policy(product)
+    return data
+
+def decision_response(query: str, product: str, combined_input: dict, result) -> dict:
+    return {
+        "query": query,
+        "product": product,
+        "input": combined_input,
+        "allowed": result,
+        "message": "Access granted" if result else "Access denied"
+    }
+
+def evaluate_query(query: str) -> dict:
+    """Parse a chat query and evaluate it against the product's policy (blocking OPA I/O)."""
+    # Parse user query to get product and input data
+    product, input_data = parse_query(query)
+    data = prepare_product(product)
+    
+    # Combine user input with data file (user input takes precedence)
+    combined_input = {**data, **input_data}
+    
+    # Evaluate policy using RegoService
+    result = rego_service.evaluate_policy(product, combined_input)
+    return decision_response(query, product, combined_input, result)
+
+def error_line(index: int, query: str, e: Exception) -> dict:
+    status_code = e.status_code if isinstance(e, HTTPException) else 500
+    detail = e.detail if isinstance(e, HTTPException) else f"Error processing query: {str(e)}"
+    return {"index": index, "query": query, "error": detail, "status_code": status_code}
+
+async def evaluate_batch(queries: list[str]):
+    """
+    Yield one result per query as NDJSON lines, in completion order (each line has
+    the query's index). Queries are grouped by product so each product's data and
+    policy are prepared once; identical inputs are evaluated once; evaluations run
+    on the threadpool, BATCH_CONCURRENCY at a time.
+    """
+    groups: dict[str, list[tuple[int, dict]]] = {}
+    for index, query in enumerate(queries):
+        try:
+            product, input_data = parse_query(query)
+        except HTTPException as e:
+            yield json.dumps(error_line(index, query, e)) + "\n"
+            continue
+        groups.setdefault(product, []).append((index, input_data))
+
+    products = list(groups)
+    prepared = await asyncio.gather(
+        *(run_in_threadpool(prepare_product, product) for product in products), return_exceptions=True
+    )
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def evaluate(product: str, combined_input: dict, indices: list[int]) -> list[dict]:
+        async with semaphore:
+            try:
+                result = await run_in_threadpool(rego_service.evaluate_policy, product, combined_input)
+            except Exception as e:
+                logger.error(f"Batch evaluation failed for {product}: {str(e)}")
+                return [error_line(index, queries[index], e) for index in indices]
+        return [{"index": index, **decision_response(queries[index], product, combined_input, result)}
+                for index in indices]
+
+    tasks = []
+    for product, data in zip(products, prepared):
+        if isinstance(data, Exception):
+            for index, _ in groups[product]:
+                yield json.dumps(error_line(index, queries[index], data)) + "\n"
+            continue
+        # Combine user input with data file (user input takes precedence); group identical inputs
+        unique: dict[str, tuple[dict, list[int]]] = {}
+        for index, input_data in groups[product]:
+            combined_input = {**data, **input_data}
+            unique.setdefault(canonical_input(combined_input), (combined_input, []))[1].append(index)
+        tasks.extend(
+            asyncio.ensure_future(evaluate(product, combined_input, indices))
+            for combined_input, indices in unique.values()
+        )
+
+    try:
+        for task in asyncio.as_completed(tasks):
+            for line in await task:
+                yield json.dumps(line) + "\n"
+    finally:
+        # The client went away: don't leave evaluations queued
+        for task in tasks:
+            task.cancel()
+
 @app.post("/chat")
 async def chat_query(query: ChatQuery):
     try:
-        # Parse user query to get product and input data
-        product, input_data = parse_query(query.query)
-        
-        # Load data file
-        data = rego_service.load_data_file(product)
-        
-        # Load and upload policy to OPA
-        policy_content = rego_service.load_policy_file(product)
-        rego_service.upload_policy_to_opa(product, policy_content)
-        
-        # Combine user input with data file (user input takes precedence)
-        combined_input = {**data, **input_data}
-        
-        # Evaluate policy using RegoService
-        result = rego_service.evaluate_policy(product, combined_input)
-        
-        # Prepare response
-        response = {
-            "query": query.query,
-            "product": product,
-            "input": combined_input,
-            "allowed": result,
-            "message": "Access granted" if result else "Access denied"
-        }
+        # OPA calls block, so they run on the threadpool instead of the event loop
+        response = await run_in_threadpool(evaluate_query, query.query)
         return JSONResponse(content=response)
     except HTTPException as e:
         raise e
@@ -96,6 +183,22 @@ async def chat_query(query: ChatQuery):
         logger.error(f"Unexpected error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@app.post("/chat/batch")
+async def chat_batch(batch: ChatBatchQuery):
+    if len(batch.queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch")
+    # Results are streamed as newline-delimited JSON as soon as each one is decided
+    return StreamingResponse(evaluate_batch(batch.queries), media_type="application/x-ndjson")
+
+@app.get("/decision-cache")
+async def decision_cache_stats():
+    return rego_service.decisions.stats()
+
+@app.get("/opa-metrics")
+async def opa_metrics():
+    # Latency of the OPA queries made on decision-cache misses, per backend
+    return rego_service.latency_stats()
+
 @app.get("/")
 async def root():
     return {"message": "AI Chat API for Rego Policy Evaluation"}
\ No newline at end of file
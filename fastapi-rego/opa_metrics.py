@@ -0,0 +1,44 @@
+import threading
+from collections import deque
+from typing import Any, Dict
+
+# Most recent calls per backend used for the latency percentiles
+LATENCY_WINDOW = 1024
+
+
+class LatencyStats:
+    """Thread-safe call count, error count and latency summary for one OPA backend."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += error
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            self._samples.append(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            samples = sorted(self._samples)
+            calls, errors, total, peak = self.calls, self.errors, self.total_seconds, self.max_seconds
+
+        def percentile(p: float) -> float:
+            return 1000 * samples[min(len(samples) - 1, int(p * len(samples)))] if samples else 0.0
+
+        return {
+            "calls": calls,
+            "errors": errors,
+            "mean_ms": 1000 * total / calls if calls else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": 1000 * peak,
+        }
@@ -1,18 +1,79 @@
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urljoin
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 from fastapi import HTTPException
 import logging
+import hashlib
 import json
 import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from decision_cache import DecisionCache, DecisionKey, MISSING, canonical_input
+from opa_metrics import LatencyStats
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Directories holding <product>.rego policies and <product>.json data
+POLICY_DIR = "policies"
+DATA_DIR = "data"
+# Seconds between checks of policies/ for edits to push to OPA (0 disables the watcher)
+POLICY_WATCH_SECONDS = float(os.getenv("POLICY_WATCH_SECONDS", "0"))
+# Keep-alive connections held open to OPA; requests beyond this wait for a free connection
+OPA_POOL_SIZE = int(os.getenv("OPA_POOL_SIZE", "32"))
+# Seconds to establish a connection to OPA and to wait for its response
+OPA_CONNECT_TIMEOUT = float(os.getenv("OPA_CONNECT_TIMEOUT", "2"))
+OPA_READ_TIMEOUT = float(os.getenv("OPA_READ_TIMEOUT", "10"))
+# How decisions are queried: "http" posts to the data API path derived from the policy's
+# package declaration; "opa_client" goes through opa-python-client's check_permission
+OPA_BACKEND = os.getenv("OPA_BACKEND", "http")
+OPA_BACKENDS = ("http", "opa_client")
+# Rule evaluated for every decision
+DECISION_RULE = "allow"
+
+# Returned by query_http when OPA has no value for the rule even after re-uploading the policy
+UNDEFINED = object()
+
+PACKAGE_PATTERN = re.compile(r"^\s*package\s+([A-Za-z_][\w.]*)", re.MULTILINE)
+
+class CachedFile(NamedTuple):
+    mtime_ns: int
+    size: int
+    sha256: str
+    content: Any  # policy text or parsed JSON data
+
 class RegoService:
-    def __init__(self, opa_host: str):
+    def __init__(self, opa_host: str, policy_dir: str = POLICY_DIR, data_dir: str = DATA_DIR,
+                 pool_size: int = OPA_POOL_SIZE, timeout: tuple = (OPA_CONNECT_TIMEOUT, OPA_READ_TIMEOUT),
+                 backend: str = OPA_BACKEND):
         self.opa_host = self.validate_opa_host(opa_host)
-        self.opa_client = self.init_opa_client()
+        if backend not in OPA_BACKENDS:
+            raise ValueError(f"Unknown OPA backend {backend!r}; expected one of {', '.join(OPA_BACKENDS)}")
+        self.backend = backend
+        # opa-python-client is only needed (and imported) when it is the configured backend
+        self.opa_client = self.init_opa_client() if backend == "opa_client" else None
+        # One pooled keep-alive session for every OPA call made by this service
+        self.http = self.init_http_session(pool_size)
+        self.timeout = timeout
+        self.decisions = DecisionCache()
+        self.policy_dir = policy_dir
+        self.data_dir = data_dir
+        # Policy and data files by product, re-read only when their mtime or size changes
+        self._policies: Dict[str, CachedFile] = {}
+        self._data: Dict[str, CachedFile] = {}
+        # sha256 of the policy version OPA has for each product
+        self._uploaded: Dict[str, str] = {}
+        # Data API path of each product's decision rule, with the policy sha256 it was derived from
+        self._decision_paths: Dict[str, Tuple[str, str]] = {}
+        self.latency: Dict[str, LatencyStats] = {name: LatencyStats() for name in OPA_BACKENDS}
+        self._lock = threading.Lock()
+        self._upload_lock = threading.Lock()
+        self._watch_stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
 
     def validate_opa_host(self, host: str):
         from urllib.parse import urlparse
@@ -21,7 +82,7 @@ class RegoService:
             if not parsed.scheme or not parsed.netloc:
                 raise ValueError("Invalid OPA_HOST format")
             return host.rstrip("/")
-        except ValueValue as e:
+        except ValueError as e:
             logger.error(f"Invalid OPA_HOST configuration: {host}. Error: {str(e)}")
             raise HTTPException(status_code=500, detail=f"Invalid OPA_HOST configuration: {host}. Must be a valid URL (e.g., http://localhost:8181)")
 
@@ -29,52 +90,199 @@ class RegoService:
         from opa_client.opa import OpaClient
         return OpaClient(host=self.opa_host)
 
+    def init_http_session(self, pool_size: int):
+        session = requests.Session()
+        # pool_block caps open connections at pool_size instead of opening throwaway ones under load
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        self.stop_watcher()
+        self.http.close()
+
     def check_opa_health(self):
         health_url = urljoin(self.opa_host, "/health")
         logger.debug(f"Checking OPA server health at {health_url}")
-        response = requests.get(health_url)
+        response = self.http.get(health_url, timeout=self.timeout)
         response.raise_for_status()
 
-    def load_data_file(self, product: str):
-        data_file = f"data/{product}.json"
+    def _read_cached(self, cache: Dict[str, CachedFile], product: str, path: str,
+                     parse: Callable[[bytes], Any]) -> CachedFile:
+        """Return the cached file unless its mtime or size changed; then re-read and re-hash it."""
+        stat = os.stat(path)
+        with self._lock:
+            cached = cache.get(product)
+        if cached and cached.mtime_ns == stat.st_mtime_ns and cached.size == stat.st_size:
+            return cached
+        with open(path, "rb") as f:
+            raw = f.read()
+        entry = CachedFile(stat.st_mtime_ns, stat.st_size, hashlib.sha256(raw).hexdigest(), parse(raw))
+        with self._lock:
+            cache[product] = entry
+        if cached and cached.sha256 != entry.sha256:
+            # Decisions made with the old policy or data are keyed by its hash; drop them now
+            dropped = self.decisions.invalidate(product)
+            logger.info(f"{path} changed; dropped {dropped} cached decisions for {product}")
+        return entry
+
+    def data_entry(self, product: str) -> CachedFile:
+        data_file = os.path.join(self.data_dir, f"{product}.json")
         try:
-            with open(data_file, "r") as f:
-                return json.load(f)
+            return self._read_cached(self._data, product, data_file, json.loads)
         except FileNotFoundError:
             raise HTTPException(status_code=500, detail=f"Data file {data_file} not found")
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, UnicodeDecodeError):
             raise HTTPException(status_code=500, detail=f"Invalid JSON in {data_file}")
 
-    def load_policy_file(self, product: str):
-        policy_file = f"policies/{product}.rego"
+    def policy_entry(self, product: str) -> CachedFile:
+        policy_file = os.path.join(self.policy_dir, f"{product}.rego")
         try:
-            with open(policy_file, "r") as f:
-                return f.read()
+            return self._read_cached(self._policies, product, policy_file, lambda raw: raw.decode("utf-8"))
         except FileNotFoundError:
             raise HTTPException(status_code=500, detail=f"Policy file {policy_file} not found")
 
+    def load_data_file(self, product: str):
+        # Shared cached object; callers must not modify it
+        return self.data_entry(product).content
+
+    def load_policy_file(self, product: str):
+        return self.policy_entry(product).content
+
+    def ensure_policy(self, product: str) -> CachedFile:
+        """Upload the product's policy unless OPA already has this content (by sha256)."""
+        policy = self.policy_entry(product)
+        if self._uploaded.get(product) != policy.sha256:
+            with self._upload_lock:
+                if self._uploaded.get(product) != policy.sha256:
+                    self.upload_policy_to_opa(product, policy.content)
+                    self._uploaded[product] = policy.sha256
+                    logger.info(f"Uploaded policy {product} ({policy.sha256[:12]})")
+        return policy
+
+    def sync_policies(self) -> List[str]:
+        """Upload every new or changed policy in policy_dir. Returns the products checked."""
+        products = sorted(name[:-len(".rego")] for name in os.listdir(self.policy_dir) if name.endswith(".rego"))
+        for product in products:
+            try:
+                self.ensure_policy(product)
+            except Exception as e:
+                logger.error(f"Failed to sync policy {product}: {str(e)}")
+        return products
+
+    def _watch(self, interval: float):
+        while not self._watch_stop.wait(interval):
+            self.sync_policies()
+
+    def start_watcher(self, interval: float = POLICY_WATCH_SECONDS):
+        """Poll policy_dir every interval seconds and push edited policies to OPA."""
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._watch_stop.clear()
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="policy-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._watch_stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(2), retry=retry_if_exception_type(requests.RequestException))
     def upload_policy_to_opa(self, product: str, policy_content: str):
         opa_url = urljoin(self.opa_host, f"/v1/policies/{product}")
         logger.debug(f"Uploading policy to OPA at {opa_url}")
-        response = requests.put(opa_url, data=policy_content.encode('utf-8'))
+        response = self.http.put(opa_url, data=policy_content.encode('utf-8'), timeout=self.timeout)
         response.raise_for_status()
 
+    def decision_path(self, product: str) -> str:
+        """Data API path of the product's allow rule, derived from its policy's package declaration."""
+        with self._lock:
+            policy = self._policies.get(product)
+        if policy is None:
+            policy = self.policy_entry(product)
+        cached = self._decision_paths.get(product)
+        if cached and cached[0] == policy.sha256:
+            return cached[1]
+        match = PACKAGE_PATTERN.search(policy.content)
+        if not match:
+            raise HTTPException(status_code=500, detail=f"Policy {product} has no package declaration")
+        package = match.group(1)
+        if package.startswith("data."):
+            package = package[len("data."):]
+        path = f"/v1/data/{package.replace('.', '/')}/{DECISION_RULE}"
+        self._decision_paths[product] = (policy.sha256, path)
+        logger.debug(f"Decision path for {product}: {path}")
+        return path
+
+    def decision_key(self, product: str, combined_input: dict) -> DecisionKey:
+        with self._lock:
+            policy, data = self._policies.get(product), self._data.get(product)
+        if policy is None:
+            policy = self.policy_entry(product)
+        return (product, policy.sha256, data.sha256 if data else None, canonical_input(combined_input))
+
     def evaluate_policy(self, product: str, combined_input: dict):
+        """Evaluate the product's allow rule, answering repeated inputs from the decision cache."""
+        key = self.decision_key(product, combined_input) if self.decisions.enabled else None
+        if key is not None:
+            decision = self.decisions.get(key)
+            if decision is not MISSING:
+                return decision
+        result = self.query_opa(product, combined_input)
+        if result is UNDEFINED:
+            # Deny, but don't cache it: the policy may be back in OPA by the next call
+            logger.error(f"OPA has no {DECISION_RULE} decision for {product}; denying")
+            return False
+        if key is not None:
+            self.decisions.put(key, result)
+        return result
+
+    def query_opa(self, product: str, combined_input: dict):
+        """Query the configured backend once and record its latency."""
+        logger.debug(f"Evaluating policy for {product} via {self.backend} with input: {combined_input}")
+        query = self.query_http if self.backend == "http" else self.query_opa_client
+        start = time.perf_counter()
         try:
-            logger.debug(f"Evaluating policy for {product} with input: {combined_input}")
-            result = self.opa_client.check_permission(combined_input, product, "allow")
-            logger.debug(f"Policy evaluation result for {product}: {result}")
-            return result
-        except Exception as e:
-            logger.error(f"OpaClient.check_permission failed: {str(e)}. Falling back to direct HTTP request.")
-            # Fallback to direct HTTP request
-            eval_url = urljoin(self.opa_host, f"/v1/data/policies/{product}/l4/allow")
-            logger.debug(f"Evaluating policy via HTTP at {eval_url}")
-            response = requests.post(
-                eval_url,
-                json={"input": combined_input},
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
-            return response.json().get("result", False)
\ No newline at end of file
+            result = query(product, combined_input)
+        except Exception:
+            self.latency[self.backend].record(time.perf_counter() - start, error=True)
+            raise
+        self.latency[self.backend].record(time.perf_counter() - start)
+        logger.debug(f"Policy evaluation result for {product}: {result}")
+        return result
+
+    def forget_upload(self, product: str) -> None:
+        """Make the next ensure_policy() upload the product's policy again."""
+        with self._upload_lock:
+            self._uploaded.pop(product, None)
+
+    def _post_decision(self, product: str, combined_input: dict) -> dict:
+        eval_url = urljoin(self.opa_host, self.decision_path(product))
+        response = self.http.post(
+            eval_url,
+            json={"input": combined_input},
+            headers={"Content-Type": "application/json"},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+    def query_http(self, product: str, combined_input: dict):
+        body = self._post_decision(product, combined_input)
+        if "result" not in body:
+            # No result means OPA doesn't have the policy (e.g. it restarted): upload it and retry once
+            logger.warning(f"OPA returned no result for {product}; re-uploading its policy")
+            self.forget_upload(product)
+            self.ensure_policy(product)
+            body = self._post_decision(product, combined_input)
+            if "result" not in body:
+                return UNDEFINED
+        return body["result"]
+
+    def query_opa_client(self, product: str, combined_input: dict):
+        return self.opa_client.check_permission(combined_input, product, DECISION_RULE)
+
+    def latency_stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend, "backends": {name: stats.stats() for name, stats in self.latency.items()}}
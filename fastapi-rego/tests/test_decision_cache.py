@@ -0,0 +1,94 @@
+import pytest
+
+import decision_cache
+from decision_cache import MISSING, DecisionCache, canonical_input
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(decision_cache.time, "monotonic", clock)
+    return clock
+
+
+def key(product="mediacomposer", region="us"):
+    return product, "policy-sha", "data-sha", canonical_input({"region": region})
+
+
+def test_hit_and_miss(clock):
+    cache = DecisionCache(max_entries=10, ttl=60)
+    assert cache.get(key()) is MISSING
+    cache.put(key(), True)
+    assert cache.get(key()) is True
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_ratio"]) == (1, 1, 0.5)
+
+
+def test_false_and_none_are_cached(clock):
+    cache = DecisionCache(max_entries=10, ttl=60)
+    cache.put(key(region="eu"), False)
+    cache.put(key(region="apac"), None)
+    assert cache.get(key(region="eu")) is False
+    assert cache.get(key(region="apac")) is None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = DecisionCache(max_entries=10, ttl=60)
+    cache.put(key(), True)
+    clock.now += 60
+    assert cache.get(key()) is True
+    clock.now += 0.001
+    assert cache.get(key()) is MISSING
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_put_refreshes_ttl(clock):
+    cache = DecisionCache(max_entries=10, ttl=60)
+    cache.put(key(), True)
+    clock.now += 50
+    cache.put(key(), False)
+    clock.now += 50
+    assert cache.get(key()) is False
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = DecisionCache(max_entries=2, ttl=60)
+    cache.put(key(region="us"), True)
+    cache.put(key(region="eu"), True)
+    cache.get(key(region="us"))
+    cache.put(key(region="apac"), True)
+    assert cache.get(key(region="eu")) is MISSING
+    assert cache.get(key(region="us")) is True
+    assert cache.get(key(region="apac")) is True
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_drops_only_that_product(clock):
+    cache = DecisionCache(max_entries=10, ttl=60)
+    cache.put(key("mediacomposer", "us"), True)
+    cache.put(key("mediacomposer", "eu"), True)
+    cache.put(key("protools", "us"), True)
+    assert cache.invalidate("mediacomposer") == 2
+    assert cache.get(key("mediacomposer", "us")) is MISSING
+    assert cache.get(key("protools", "us")) is True
+
+
+def test_disabled_cache_stores_nothing():
+    cache = DecisionCache(max_entries=0, ttl=60)
+    assert not cache.enabled
+    cache.put(key(), True)
+    assert cache.get(key()) is MISSING
+
+
+def test_canonical_input_ignores_key_order():
+    assert canonical_input({"a": 1, "b": {"c": 2, "d": 3}}) == canonical_input({"b": {"d": 3, "c": 2}, "a": 1})
+    assert canonical_input({"a": 1}) != canonical_input({"a": "1"})
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from frame_analysis import CAPTION_MAX_LENGTH
+from model_registry import MODEL_VERSION
+from vector_codec import encode_vector, decode_vector
+
+# On-disk cache of per-frame analysis results, shared by all jobs (0 MB disables it)
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", "../contents/cache/analysis.db")
+ANALYSIS_CACHE_BYTES = int(os.getenv("ANALYSIS_CACHE_MB", "2048")) * 1024 * 1024
+# Eviction trims the cache to this share of its limit so it doesn't evict on every write
+EVICT_TO_RATIO = 0.9
+COUNTERS = ("hits", "misses", "writes", "evictions")
+
+
+class CachedAnalysis(NamedTuple):
+    """Analysis of one frame: key always set; the rest is None until the frame has been analysed."""
+    key: str
+    object_names: Optional[List[str]] = None
+    caption: Optional[str] = None
+    embedding: Optional[np.ndarray] = None
+    image: Optional[bytes] = None  # encoded annotated frame
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache of YOLO detections, BLIP caption, caption embedding and
+    annotated JPEG per frame. Keys combine a hash of the decoded frame's pixels with
+    the model versions, so the same footage reached by URL, local path or an
+    overlapping clip is only analysed once, and new weights never reuse old results.
+    Entries live in a SQLite file and are evicted least recently used first once
+    their total size exceeds max_bytes. The total size and the hit, miss, write and
+    eviction counters are kept in the same file, so every worker and segment process
+    enforces one limit and the API process reports what the workers did.
+    """
+
+    def __init__(self, path: str = ANALYSIS_CACHE_PATH, max_bytes: int = ANALYSIS_CACHE_BYTES,
+                 model_version: str = f"{MODEL_VERSION}+max_length={CAPTION_MAX_LENGTH}"):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.model_version = model_version
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Counter increments not yet written to cache_stats (flushed with the next write)
+        self._pending = dict.fromkeys(COUNTERS, 0)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS frame_analysis ("
+                "key TEXT PRIMARY KEY, object_names TEXT, caption TEXT, embedding BLOB, image BLOB, "
+                "size INTEGER, last_used REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS frame_analysis_last_used ON frame_analysis (last_used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.executemany("INSERT OR IGNORE INTO cache_stats VALUES (?, 0)", [(name,) for name in COUNTERS])
+            # Caches written before the total was stored start from the size of their entries
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_stats SELECT 'bytes', COALESCE(SUM(size), 0) FROM frame_analysis"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _flush_counters_locked(self, conn: sqlite3.Connection) -> None:
+        """Add pending counter increments to cache_stats inside the caller's transaction."""
+        updates = [(count, name) for name, count in self._pending.items() if count]
+        if updates:
+            conn.executemany("UPDATE cache_stats SET value = value + ? WHERE name = ?", updates)
+            self._pending = dict.fromkeys(COUNTERS, 0)
+
+    def _stat_locked(self, conn: sqlite3.Connection, name: str) -> int:
+        return conn.execute("SELECT value FROM cache_stats WHERE name = ?", (name,)).fetchone()[0]
+
+    def key(self, frame: np.ndarray) -> str:
+        digest = hashlib.blake2b(str(frame.shape).encode(), digest_size=20)
+        digest.update(np.ascontiguousarray(frame).data)
+        return f"{self.model_version}:{digest.hexdigest()}"
+
+    def lookup(self, frame: np.ndarray) -> CachedAnalysis:
+        """Cached analysis of a frame, or an entry holding only its key on a miss."""
+        key = self.key(frame)
+        return self.get(key) or CachedAnalysis(key)
+
+    def get(self, key: str) -> Optional[CachedAnalysis]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT object_names, caption, embedding, image FROM frame_analysis WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                # Counted with the put() that follows the analysis
+                self._pending["misses"] += 1
+                return None
+            self._pending["hits"] += 1
+            try:
+                conn.execute("UPDATE frame_analysis SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._flush_counters_locked(conn)
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Analysis cache update failed: {e}")
+        object_names, caption, embedding, image = row
+        return CachedAnalysis(key, json.loads(object_names), caption, decode_vector(embedding), image)
+
+    def put(self, entry: CachedAnalysis) -> None:
+        embedding = encode_vector(entry.embedding)
+        object_names = json.dumps(entry.object_names)
+        size = len(entry.key) + len(object_names) + len(entry.caption) + len(embedding) + len(entry.image)
+        try:
+            with self._lock:
+                conn = self._connect()
+                # Take the write lock first so the stored total can't change under us
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    previous = conn.execute("SELECT size FROM frame_analysis WHERE key = ?", (entry.key,)).fetchone()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO frame_analysis VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (entry.key, object_names, entry.caption, embedding, entry.image, size, time.time())
+                    )
+                    conn.execute("UPDATE cache_stats SET value = value + ? WHERE name = 'bytes'",
+                                 (size - (previous[0] if previous else 0),))
+                    self._pending["writes"] += 1
+                    total_bytes = self._stat_locked(conn, "bytes")
+                    if total_bytes > self.max_bytes:
+                        self._evict_locked(conn, total_bytes)
+                    self._flush_counters_locked(conn)
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+        except sqlite3.Error as e:
+            print(f"Analysis cache write failed: {e}")
+
+    def _evict_locked(self, conn: sqlite3.Connection, total_bytes: int) -> None:
+        target = self.max_bytes * EVICT_TO_RATIO
+        freed = 0
+        while total_bytes - freed > target:
+            victims = conn.execute(
+                "SELECT key, size FROM frame_analysis ORDER BY last_used LIMIT 256"
+            ).fetchall()
+            if not victims:
+                break
+            evicted = []
+            for key, size in victims:
+                if total_bytes - freed <= target:
+                    break
+                evicted.append((key,))
+                freed += size
+            conn.executemany("DELETE FROM frame_analysis WHERE key = ?", evicted)
+            self._pending["evictions"] += len(evicted)
+        conn.execute("UPDATE cache_stats SET value = value - ? WHERE name = 'bytes'", (freed,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of every process using the cache file since it was created."""
+        counters = dict.fromkeys(COUNTERS + ("bytes",), 0)
+        entries = 0
+        if self.enabled:
+            with self._lock:
+                conn = self._connect()
+                entries = conn.execute("SELECT COUNT(*) FROM frame_analysis").fetchone()[0]
+                counters.update(conn.execute("SELECT name, value FROM cache_stats").fetchall())
+                for name, count in self._pending.items():
+                    counters[name] += count
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "path": self.path,
+            "model_version": self.model_version,
+            "entries": entries,
+            "bytes": counters["bytes"],
+            "max_bytes": self.max_bytes,
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "hit_ratio": round(counters["hits"] / lookups, 3) if lookups else None,
+            "writes": counters["writes"],
+            "evictions": counters["evictions"],
+        }
+
+
+# One cache per service process (the SQLite file is shared between processes)
+analysis_cache = AnalysisCache()
@@ -0,0 +1,64 @@
+"""
+Benchmark multi-process frame analysis: frames/sec with 1..N analysis processes,
+each with its own models and TORCH_THREADS_PER_PROCESS (default: cores / processes).
+The analysis cache is bypassed so every run does the full YOLO/BLIP/embedding work.
+
+Usage:
+    python bench_segment_scaling.py ../contents/media/<video_name>.mp4 --duration 60 --processes 1 2 4 8
+"""
+import argparse
+import os
+import time
+
+import cv2
+
+from segment_analysis import analyse_segments, torch_threads_for
+
+
+def run(video_path, fps, duration, total_frames, args, processes):
+    results = list(analyse_segments(
+        video_path, fps, duration, total_frames, args.sampling_mode, args.frame_stride, args.target_fps,
+        None, args.scene_threshold, use_cache=False, processes=processes
+    ))
+    frame_numbers = [item[0] for item, _, _ in results]
+    if frame_numbers != sorted(frame_numbers):
+        raise SystemExit(f"Results out of frame order with {processes} processes")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video_path")
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--sampling-mode", default="fps", choices=["all", "stride", "fps"])
+    parser.add_argument("--frame-stride", type=int, default=1)
+    parser.add_argument("--target-fps", type=float, default=2.0)
+    parser.add_argument("--scene-threshold", type=float, default=0.0)
+    args = parser.parse_args()
+
+    cap = cv2.VideoCapture(args.video_path)
+    if not cap.isOpened():
+        raise SystemExit(f"Could not open video: {args.video_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    total_frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+    cap.release()
+
+    print(f"cpus={os.cpu_count()} fps={fps:.2f} duration={args.duration}s sampling={args.sampling_mode}")
+    print(f"{'processes':<12}{'threads/proc':>14}{'frames':>8}{'frames/sec':>12}{'speedup':>10}")
+    base_fps = None
+    for processes in sorted(set(args.processes)):
+        # Warm-up: starts the pool and loads every process's models outside the timing
+        run(args.video_path, fps, min(args.duration, processes * 2.0), total_frames, args, processes)
+
+        start = time.perf_counter()
+        results = run(args.video_path, fps, args.duration, total_frames, args, processes)
+        elapsed = time.perf_counter() - start
+        frames_per_sec = len(results) / elapsed
+        base_fps = base_fps or frames_per_sec
+        print(f"{processes:<12}{torch_threads_for(processes):>14}{len(results):>8}"
+              f"{frames_per_sec:>12.2f}{frames_per_sec / base_fps:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict
+
+# How local files are identified: "stat" (path, size, mtime) or "content" (SHA-256 of
+# the bytes, so copies of the same media under different paths match)
+FINGERPRINT_MODE = os.getenv("FINGERPRINT_MODE", "stat")
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_identity(path: str) -> Dict[str, Any]:
+    """Identity of a local media file for job fingerprints."""
+    if FINGERPRINT_MODE == "content":
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+                digest.update(block)
+        return {"sha256": digest.hexdigest()}
+    stat = os.stat(path)
+    return {"path": os.path.abspath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def job_fingerprint(**parts: Any) -> str:
+    """Stable hash of everything that determines a job's results."""
+    canonical = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
@@ -0,0 +1,272 @@
+import os
+import subprocess
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+
+from pipeline import ThreadedStage, IDLE
+
+# BLIP batching (frames per generate call, seconds a partial batch may wait)
+CAPTION_BATCH_SIZE = int(os.getenv("CAPTION_BATCH_SIZE", "8"))
+CAPTION_MAX_WAIT = float(os.getenv("CAPTION_MAX_WAIT", "2.0"))
+CAPTION_MAX_LENGTH = 50
+
+# Distinct captions per SentenceTransformer encode call
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+SAMPLING_MODES = ("all", "stride", "fps", "keyframe")
+
+# Frames are downscaled to this size before computing scene-change signatures
+SCENE_SIGNATURE_SIZE = (64, 36)
+
+
+class BatchCaptioner:
+    """
+    Collects decoded frames and captions them with a single BLIP processor/generate
+    call per batch. Captions are returned paired with their items in submission order.
+    """
+
+    def __init__(self, processor, model, device: str, batch_size: int = CAPTION_BATCH_SIZE,
+                 max_wait: float = CAPTION_MAX_WAIT, max_length: int = CAPTION_MAX_LENGTH):
+        self.processor = processor
+        self.model = model
+        self.device = device
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.max_length = max_length
+        self._pending: List[Tuple[Any, Optional[Image.Image]]] = []
+        self._pending_images = 0
+        self._first_added = 0.0
+        self._last_caption = ""
+
+    def caption_images(self, images: List[Image.Image]) -> List[str]:
+        if not images:
+            return []
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            output_ids = self.model.generate(**inputs, max_length=self.max_length)
+        return self.processor.batch_decode(output_ids, skip_special_tokens=True)
+
+    def time_left(self) -> Optional[float]:
+        """Seconds until the pending partial batch has waited max_wait, or None when nothing is pending."""
+        if not self._pending:
+            return None
+        return self.max_wait - (time.monotonic() - self._first_added)
+
+    def add(self, item: Any, image: Optional[Image.Image], caption: Optional[str] = None) -> List[Tuple[Any, str]]:
+        """
+        Queue a frame; returns the captioned batch once it is full or has waited max_wait.
+        A frame whose caption is already known passes it in caption; otherwise an
+        image of None marks a frame that inherits the caption of the frame before it.
+        """
+        if not self._pending:
+            self._first_added = time.monotonic()
+        self._pending.append((item, image, caption))
+        if image is not None:
+            self._pending_images += 1
+        waited = time.monotonic() - self._first_added
+        if self._pending_images >= self.batch_size or waited >= self.max_wait:
+            return self.flush()
+        return []
+
+    def flush(self) -> List[Tuple[Any, str]]:
+        pending, self._pending = self._pending, []
+        self._pending_images = 0
+        captions = iter(self.caption_images([image for _, image, _ in pending if image is not None]))
+        results = []
+        for item, image, caption in pending:
+            if caption is not None:
+                self._last_caption = caption
+            elif image is not None:
+                self._last_caption = next(captions)
+            results.append((item, self._last_caption))
+        return results
+
+
+def frame_signature(frame) -> Any:
+    """Cheap scene signature: normalised hue/saturation histogram of a downscaled frame."""
+    small = cv2.resize(frame, SCENE_SIGNATURE_SIZE, interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    hist = cv2.calcHist([hsv], [0, 1], None, [16, 16], [0, 180, 0, 256])
+    return cv2.normalize(hist, hist)
+
+
+def scene_distance(signature_a, signature_b) -> float:
+    """Bhattacharyya distance between two frame signatures (0 = identical, 1 = disjoint)."""
+    return float(cv2.compareHist(signature_a, signature_b, cv2.HISTCMP_BHATTACHARYYA))
+
+
+def probe_keyframe_times(video_path: str) -> List[float]:
+    """Return presentation timestamps (seconds) of the video's keyframes using ffprobe."""
+    try:
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0", "-skip_frame", "nokey",
+             "-show_entries", "frame=best_effort_timestamp_time", "-of", "csv=p=0", video_path],
+            capture_output=True, text=True, check=True
+        )
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return []
+    times = []
+    for line in result.stdout.splitlines():
+        value = line.strip().rstrip(",")
+        if value and value != "N/A":
+            times.append(float(value))
+    return sorted(times)
+
+
+def sample_frames(cap, fps: float, max_duration: float, sampling_mode: str = "all", frame_stride: int = 1,
+                  target_fps: float = 1.0, keyframe_times: Optional[List[float]] = None,
+                  start_frame: int = 0, end_frame: Optional[int] = None) -> Iterator[Tuple[int, float, Any]]:
+    """
+    Decode the frames selected by the sampling mode up to max_duration.
+    Yields (frame_number, timestamp, bgr_frame). Skipped frames are only grabbed,
+    never retrieved or colour-converted; keyframe mode seeks straight to each keyframe.
+    start_frame/end_frame restrict decoding to one segment [start_frame, end_frame)
+    of the video; frame numbers and the stride stay aligned to the whole video.
+    """
+    fps = fps if fps > 0 else 25
+
+    if sampling_mode == "keyframe":
+        last_frame = -1
+        for keyframe_time in keyframe_times or []:
+            if keyframe_time > max_duration:
+                break
+            frame_number = int(round(keyframe_time * fps))
+            if frame_number <= last_frame or frame_number < start_frame:
+                continue
+            if end_frame is not None and frame_number >= end_frame:
+                break
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            last_frame = frame_number
+            yield frame_number, frame_number / fps, frame
+        return
+
+    if sampling_mode == "stride":
+        stride = max(1, frame_stride)
+    elif sampling_mode == "fps":
+        stride = max(1, int(round(fps / target_fps)))
+    else:
+        stride = 1
+
+    frame_number = start_frame
+    if start_frame > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    while end_frame is None or frame_number < end_frame:
+        timestamp = frame_number / fps
+        if timestamp > max_duration:
+            break
+        if frame_number % stride == 0:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield frame_number, timestamp, frame
+        elif not cap.grab():
+            break
+        frame_number += 1
+
+
+def detect_frames(frames: Iterable[Tuple[int, float, Any]], yolo_model, scene_threshold: float = 0.0,
+                  cache=None) -> Iterator[Tuple[Tuple, Optional[Image.Image], Optional[str]]]:
+    """
+    Run YOLO on each sampled frame. Yields
+    ((frame_number, timestamp, annotated_frame, object_names, inherited_from, cached), pil_image, caption).
+
+    With a scene_threshold > 0, frames whose signature is within that distance of the
+    last analysed frame skip YOLO and captioning: they are yielded with
+    annotated_frame and pil_image set to None and inherited_from set to the frame
+    number whose results they reuse.
+
+    With an AnalysisCache, every other frame is looked up by content first and
+    `cached` holds its CachedAnalysis. On a hit YOLO is skipped: annotated_frame is
+    the cached JPEG and the cached caption is passed on instead of pil_image.
+    """
+    last_signature = None
+    last_frame_number = None
+    last_object_names: List[str] = []
+    for frame_number, timestamp, frame in frames:
+        if scene_threshold > 0:
+            signature = frame_signature(frame)
+            if last_signature is not None and scene_distance(signature, last_signature) < scene_threshold:
+                yield (frame_number, timestamp, None, last_object_names, last_frame_number, None), None, None
+                continue
+            last_signature = signature
+
+        cached = cache.lookup(frame) if cache is not None else None
+        if cached is not None and cached.caption is not None:
+            last_frame_number, last_object_names = frame_number, cached.object_names
+            yield (frame_number, timestamp, cached.image, cached.object_names, None, cached), None, cached.caption
+            continue
+
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+        # YOLOv8 object detection
+        yolo_results = yolo_model(frame_rgb)
+        objects = [(int(box.cls), float(box.conf)) for box in yolo_results[0].boxes]
+        object_names = [f"{yolo_model.names[obj]} ({conf:.2f})" for obj, conf in objects]
+        last_frame_number, last_object_names = frame_number, object_names
+
+        yield (frame_number, timestamp, yolo_results[0].plot(), object_names, None, cached), Image.fromarray(frame_rgb), None
+
+
+def caption_frames(frames: Iterable[Tuple[Any, Optional[Image.Image], Optional[str]]], captioner: BatchCaptioner
+                   ) -> Iterator[Tuple[Any, str]]:
+    """
+    Caption (item, image, known_caption) triples in batches, yielding (item, caption) in
+    input order. Frames are pulled on a background thread, so a partial batch is
+    captioned once it has waited max_wait even while the next frame is slow to arrive.
+    """
+    if captioner.max_wait == float("inf"):
+        for item, image, caption in frames:
+            yield from captioner.add(item, image, caption)
+        yield from captioner.flush()
+        return
+    source = ThreadedStage(frames, "detect", maxsize=captioner.batch_size)
+    try:
+        for entry in source.poll(captioner.time_left):
+            if entry is IDLE:
+                yield from captioner.flush()
+            else:
+                yield from captioner.add(*entry)
+    finally:
+        source.close()
+    yield from captioner.flush()
+
+
+def embed_frames(frames: Iterable[Tuple[Tuple, str]], embed_model, batch_size: int = EMBED_BATCH_SIZE
+                 ) -> Iterator[Tuple[Tuple, str, np.ndarray]]:
+    """
+    Attach a caption embedding to each captioned frame, yielding (item, caption, embedding)
+    in input order. Each distinct caption is embedded once per call (consecutive frames
+    of a scene usually share one), batch_size new captions per encode call; frames
+    whose captions are already known, or that carry a cached embedding, pass straight through.
+    """
+    embeddings: Dict[str, np.ndarray] = {}
+    pending: List[Tuple[Tuple, str]] = []
+    new_captions: List[str] = []
+
+    def flush():
+        if new_captions:
+            encoded = embed_model.encode(new_captions, batch_size=batch_size, convert_to_numpy=True)
+            embeddings.update(zip(new_captions, encoded))
+            new_captions.clear()
+        for item, caption in pending:
+            yield item, caption, embeddings[caption]
+        pending.clear()
+
+    for item, caption in frames:
+        pending.append((item, caption))
+        cached = item[5]
+        if cached is not None and cached.embedding is not None and caption not in embeddings:
+            embeddings[caption] = cached.embedding
+        if caption not in embeddings and caption not in new_captions:
+            new_captions.append(caption)
+        if not new_captions or len(new_captions) >= batch_size:
+            yield from flush()
+    yield from flush()
@@ -7,24 +7,68 @@ import re
 import cv2
 import json
 import shutil
-from fastapi import FastAPI, Depends, BackgroundTasks, HTTPException
+import time
+from concurrent.futures import Future
+from functools import partial
+from fastapi import FastAPI, Depends, HTTPException
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 from database import create_db_and_tables, get_session, engine
-from models import VideoJob, VideoFrameTimeseries, VideoFrameVector, AudioTranscriptChunk, FrameTranscriptAssociation
+from models import ACTIVE_JOB_STATUSES, VideoJob, VideoFrameTimeseries, VideoFrameVector, AudioTranscriptChunk, FrameTranscriptAssociation
 from datetime import datetime
 from yt_dlp import YoutubeDL
-from ultralytics import YOLO
-from transformers import BlipProcessor, BlipForConditionalGeneration
-from sentence_transformers import SentenceTransformer
-import torch
-from PIL import Image
+from model_registry import registry, DEVICE, MODEL_VERSION
+from frame_analysis import (
+    BatchCaptioner, SAMPLING_MODES, CAPTION_MAX_LENGTH, probe_keyframe_times, sample_frames, detect_frames, caption_frames, embed_frames
+)
+from pipeline import ThreadedStage, ImageWriter, StageStats
+from bulk_writer import BulkWriter
+from vector_codec import encode_vector, vector_to_list, VECTOR_PRECISION
+from vector_index import frame_index, ANN_NPROBE
+from analysis_cache import analysis_cache, CachedAnalysis
+from segment_analysis import analyse_segments, ANALYSIS_PROCESSES
+from fingerprint import file_identity, job_fingerprint
+from job_queue import WorkerPool
+from worker import video_worker, VIDEO_WORKERS, EMBEDDED_WORKERS
 
 app = FastAPI()
 
+# Length of the caption transcript windows stored in AudioTranscriptChunk
+CHUNK_SECONDS = 5
+# Job statuses an identical new request is attached to instead of starting a new job
+REUSABLE_JOB_STATUSES = ("pending", "processing", "complete")
+
+def find_identical_job(session: Session, fingerprint: str, statuses=REUSABLE_JOB_STATUSES):
+    """Most recent job with this fingerprint in one of statuses, or None."""
+    return session.exec(
+        select(VideoJob)
+        .where((VideoJob.fingerprint == fingerprint) & (VideoJob.status.in_(statuses)))
+        .order_by(VideoJob.id.desc())
+    ).first()
+
+# Jobs run in worker processes, not the web server; see worker.py
+worker_pool = WorkerPool(VideoJob, video_worker, VIDEO_WORKERS if EMBEDDED_WORKERS else 0, name="video-worker")
+
 class VideoMediaRequest(BaseModel):
     url: str | None = None
     local_path: str | None = None
+    sampling_mode: str = "all"  # "all", "stride", "fps" or "keyframe"
+    frame_stride: int = 1  # analyse every Nth frame (sampling_mode "stride")
+    target_fps: float = 1.0  # frames analysed per second of video (sampling_mode "fps")
+    scene_threshold: float = 0.0  # reuse previous results below this scene-change distance (0 disables)
+    store_associations: bool = True  # False: derive frame/chunk links from timestamps at query time
+    force: bool = False  # process again even if an identical job exists
+    priority: int = 0  # higher-priority jobs are picked up by workers first
+
+class FrameSearchRequest(BaseModel):
+    query: str
+    top_k: int = 10
+    job_id: int | None = None  # restrict to one job
+    start_time: float | None = None  # frame timestamp range in seconds, [start_time, end_time)
+    end_time: float | None = None
+    nprobe: int = ANN_NPROBE  # index lists scanned; raise for better recall
+    exact: bool = False  # brute-force scan instead of the ANN index
 
 def get_video_id_from_url(url):
     if not url:
@@ -51,11 +95,50 @@ def get_video_duration(youtube_url=None, local_path=None, config_path="video_con
 def on_startup():
     create_db_and_tables()
     os.makedirs("../contents/media", exist_ok=True)
+    # The API only embeds search queries; job workers load the vision models
+    registry.warm_up(["embedder"])
+    # Restore the saved frame index and catch up with vectors written since
+    frame_index.load()
+    added = frame_index.sync(engine)
+    if added:
+        print(f"Added {added} frame vectors to the search index")
+        frame_index.save()
+    worker_pool.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    worker_pool.stop()
+    frame_index.save()
+
+def video_job_fingerprint(request: "VideoMediaRequest") -> str:
+    """Fingerprint of everything that determines a video job's results."""
+    if request.local_path:
+        source = {"local_file": file_identity(request.local_path)}
+        duration = get_video_duration(local_path=request.local_path)
+    else:
+        source = {"url": get_video_id_from_url(request.url) or request.url}
+        duration = get_video_duration(request.url)
+    sampling = {"mode": request.sampling_mode}
+    if request.sampling_mode == "stride":
+        sampling["frame_stride"] = request.frame_stride
+    elif request.sampling_mode == "fps":
+        sampling["target_fps"] = request.target_fps
+    return job_fingerprint(
+        source=source, duration=duration, sampling=sampling, scene_threshold=request.scene_threshold,
+        store_associations=request.store_associations, chunk_seconds=CHUNK_SECONDS,
+        models=f"{MODEL_VERSION}+max_length={CAPTION_MAX_LENGTH}", vector_precision=VECTOR_PRECISION
+    )
 
 @app.post("/process_media_video/")
-def process_media_video(request: VideoMediaRequest, background_tasks: BackgroundTasks, session: Session = Depends(get_session)):
+def process_media_video(request: VideoMediaRequest, session: Session = Depends(get_session)):
     if (request.url is None and request.local_path is None) or (request.url and request.local_path):
         raise HTTPException(status_code=400, detail="Provide exactly one of url or local_path")
+    if request.sampling_mode not in SAMPLING_MODES:
+        raise HTTPException(status_code=400, detail=f"sampling_mode must be one of {', '.join(SAMPLING_MODES)}")
+    if request.frame_stride < 1 or request.target_fps <= 0:
+        raise HTTPException(status_code=400, detail="frame_stride must be >= 1 and target_fps must be > 0")
+    if not 0 <= request.scene_threshold <= 1:
+        raise HTTPException(status_code=400, detail="scene_threshold must be between 0 and 1")
     
     if request.local_path:
         if not os.path.exists(request.local_path):
@@ -66,14 +149,141 @@ def process_media_video(request: VideoMediaRequest, background_tasks: Background
     else:
         video_name = get_video_id_from_url(request.url) or "unknown"
     
-    job = VideoJob(url=request.url, video_name=video_name, status="pending")
+    fingerprint = video_job_fingerprint(request)
+    # An identical completed job is returned as is; an identical pending or
+    # running job is joined (callers poll the same job_id)
+    existing = None if request.force else find_identical_job(session, fingerprint)
+    if existing:
+        return {"job_id": existing.id, "url": request.url, "local_path": request.local_path,
+                "video_name": existing.video_name, "status": existing.status, "deduplicated": True}
+
+    # Queue the job; a worker claims it from the table (see job_queue.claim_job)
+    settings = {
+        "sampling_mode": request.sampling_mode,
+        "frame_stride": request.frame_stride,
+        "target_fps": request.target_fps,
+        "scene_threshold": request.scene_threshold,
+        "store_associations": request.store_associations,
+    }
+    job = VideoJob(url=request.url, local_path=request.local_path, video_name=video_name, status="pending",
+                   store_associations=request.store_associations, fingerprint=fingerprint,
+                   settings=json.dumps(settings), priority=request.priority)
     session.add(job)
-    session.commit()
+    try:
+        session.commit()
+    except IntegrityError:
+        # An identical job was queued concurrently (possibly by another API process):
+        # the unique index on active fingerprints rejected this one, so join that job
+        session.rollback()
+        existing = find_identical_job(session, fingerprint, ACTIVE_JOB_STATUSES)
+        if existing is None:
+            raise
+        return {"job_id": existing.id, "url": request.url, "local_path": request.local_path,
+                "video_name": existing.video_name, "status": existing.status, "deduplicated": True}
     session.refresh(job)
-    background_tasks.add_task(process_video, job.id, request.url, request.local_path)
-    return {"job_id": job.id, "url": request.url, "local_path": request.local_path, "video_name": job.video_name}
-
-def process_video(job_id: int, youtube_url: str | None, local_path: str | None):
+    return {"job_id": job.id, "url": request.url, "local_path": request.local_path, "video_name": job.video_name,
+            "status": job.status, "deduplicated": False}
+
+def save_frames(writer: BulkWriter, frame_rows: list[dict], vector_rows: list[dict], frames_info: list[dict]):
+    """
+    Bulk insert buffered VideoFrameTimeseries rows and their VideoFrameVector rows,
+    fill in the generated vector IDs for the JSON export and empty the buffers.
+    """
+    frame_ids = writer.insert(VideoFrameTimeseries, frame_rows)
+    for vector_row, frame_id in zip(vector_rows, frame_ids):
+        vector_row["timeseries_id"] = frame_id
+    vector_ids = writer.insert(VideoFrameVector, vector_rows)
+    for info, vector_id in zip(frames_info, vector_ids):
+        info["vector_id"] = vector_id
+    frame_rows.clear()
+    vector_rows.clear()
+    frames_info.clear()
+    return frame_ids
+
+def save_transcript_chunk(writer: BulkWriter, job_id: int, chunk_index: int, captions: list[str],
+                          frame_ids: list[int], end_time: float, store_associations: bool = True):
+    """
+    Store the caption transcript for one CHUNK_SECONDS window and link it to the
+    frames analysed inside it (frame_ids, already inserted by save_frames).
+    Returns (chunk_info, associations_info) for the JSON export.
+    """
+    transcript = " ".join(captions)
+    start_time = chunk_index * CHUNK_SECONDS
+    [chunk_id] = writer.insert(AudioTranscriptChunk, [{
+        "job_id": job_id,
+        "chunk_index": chunk_index,
+        "start_time": start_time,
+        "end_time": end_time,
+        "transcript": transcript
+    }])
+
+    # Create FrameTranscriptAssociation (bulk) unless links are derived from timestamps
+    associations_info = [
+        {"frame_id": frame_id, "transcript_chunk_id": chunk_id}
+        for frame_id in frame_ids
+    ]
+    if store_associations:
+        writer.insert(FrameTranscriptAssociation, associations_info, returning=False)
+
+    chunk_info = {
+        "chunk_index": chunk_index,
+        "start_time": start_time,
+        "end_time": end_time,
+        "transcript": transcript
+    }
+    return chunk_info, associations_info
+
+def cache_analysis(entry: CachedAnalysis, written: Future):
+    """Store a newly analysed frame in the analysis cache once its annotated JPEG is encoded."""
+    if written.exception() is None:
+        analysis_cache.put(entry._replace(image=written.result()))
+
+def load_checkpoint(session: Session, job_id: int):
+    """
+    Rebuild the JSON export entries of the frames, transcript chunks and associations
+    a resumed job committed before its checkpoint.
+    Returns (frames_info, chunks_info, associations_info).
+    """
+    frames = session.exec(
+        select(VideoFrameTimeseries)
+        .where(VideoFrameTimeseries.job_id == job_id)
+        .order_by(VideoFrameTimeseries.frame_number)
+    ).all()
+    vector_ids = dict(session.exec(
+        select(VideoFrameVector.timeseries_id, VideoFrameVector.id).where(VideoFrameVector.job_id == job_id)
+    ).all())
+    chunks = session.exec(
+        select(AudioTranscriptChunk)
+        .where(AudioTranscriptChunk.job_id == job_id)
+        .order_by(AudioTranscriptChunk.chunk_index)
+    ).all()
+    chunk_ids = {chunk.chunk_index: chunk.id for chunk in chunks}
+
+    frames_info = [{
+        "frame_number": frame.frame_number,
+        "timestamp": frame.timestamp,
+        "image_file": frame.image_file,
+        "objects": json.loads(frame.objects),
+        "caption": frame.caption,
+        "inherited_from_frame": frame.inherited_from_frame,
+        "vector_id": vector_ids.get(frame.id)
+    } for frame in frames]
+    chunks_info = [{
+        "chunk_index": chunk.chunk_index,
+        "start_time": chunk.start_time,
+        "end_time": chunk.end_time,
+        "transcript": chunk.transcript
+    } for chunk in chunks]
+    # Frames belong to the chunk of the CHUNK_SECONDS window they fall in
+    associations_info = [
+        {"frame_id": frame.id, "transcript_chunk_id": chunk_ids[int(frame.timestamp // CHUNK_SECONDS)]}
+        for frame in frames if int(frame.timestamp // CHUNK_SECONDS) in chunk_ids
+    ]
+    return frames_info, chunks_info, associations_info
+
+def process_video(job_id: int, youtube_url: str | None, local_path: str | None, sampling_mode: str = "all",
+                  frame_stride: int = 1, target_fps: float = 1.0, scene_threshold: float = 0.0,
+                  store_associations: bool = True):
     with Session(engine) as session:
         job = session.get(VideoJob, job_id)
         job.status = "processing"
@@ -89,7 +299,11 @@ def process_video(job_id: int, youtube_url: str | None, local_path: str | None):
             json_path = os.path.join(frames_folder, "video_data.json")
 
             # Handle video source
-            if local_path:
+            resume_frame = job.checkpoint_frame
+            if resume_frame and os.path.exists(video_file_path):
+                # Resuming: the video was copied or downloaded by the earlier attempt
+                duration = get_video_duration(youtube_url, local_path)
+            elif local_path:
                 # Validate and copy local file
                 cap = cv2.VideoCapture(local_path)
                 if not cap.isOpened():
@@ -119,200 +333,189 @@ def process_video(job_id: int, youtube_url: str | None, local_path: str | None):
                 with YoutubeDL(ydl_opts) as ydl:
                     ydl.download([youtube_url])
 
-            # Load models
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            yolo_model = YOLO('yolov8n.pt')
-            processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-            blip_model = BlipForConditionalGeneration.from_pretrained(
-                "Salesforce/blip-image-captioning-base"
-            ).to(device)
-            blip_model.eval()
-            embed_model = SentenceTransformer('all-MiniLM-L6-v2')
-
             # Process video
             cap = cv2.VideoCapture(video_file_path)
             if not cap.isOpened():
                 raise ValueError("Error: Could not open video.")
             fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_count = 0
-            chunk_size = int(fps * 5) if fps > 0 else 25
+            if fps <= 0:
+                fps = 25
+            max_duration = float(duration)
+            total_frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            video_end = min(max_duration, total_frames / fps) if total_frames > 0 else max_duration
             chunk_captions = []
             chunk_index = 0
+            chunk_frame_ids = []
+            chunk_last_timestamp = 0.0
             all_frames_info = []
             all_chunks_info = []
             all_associations_info = []
-            max_duration = float(duration)
-
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                timestamp = frame_count / fps if fps > 0 else frame_count / 25
-                if timestamp > max_duration:
-                    break
-
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-                # YOLOv8 object detection
-                yolo_results = yolo_model(frame_rgb)
-                objects = [(int(box.cls), float(box.conf)) for box in yolo_results[0].boxes]
-                object_names = [f"{yolo_model.names[obj]} ({conf:.2f})" for obj, conf in objects]
-
-                # BLIP captioning
-                pil_img = Image.fromarray(frame_rgb)
-                inputs = processor(pil_img, return_tensors="pt").to(device)
-                with torch.no_grad():
-                    output_ids = blip_model.generate(**inputs, max_length=50)
-                    caption = processor.decode(output_ids[0], skip_special_tokens=True)
-
-                # Save frame image in <video_name> folder
-                image_filename = f"frame_{frame_count:05d}.jpg"
-                image_path = os.path.join(frames_folder, image_filename)
-                cv2.imwrite(image_path, yolo_results[0].plot())
-
-                # Save frame metadata to DB
-                frame_record = VideoFrameTimeseries(
-                    job_id=job.id,
-                    frame_number=frame_count,
-                    timestamp=timestamp,
-                    image_file=image_filename,
-                    objects=json.dumps(object_names),
-                    caption=caption
-                )
-                session.add(frame_record)
-                session.flush()
-
-                # Generate and save vector embedding
-                embedding = embed_model.encode(caption).tolist()
-                vector_record = VideoFrameVector(
-                    job_id=job.id,
-                    timeseries_id=frame_record.id,
-                    frame_number=frame_count,
-                    vector=json.dumps(embedding),
-                    caption=caption
-                )
-                session.add(vector_record)
-                session.flush()
-
-                chunk_captions.append(caption)
-                if (frame_count + 1) % chunk_size == 0:
-                    transcript = " ".join(chunk_captions)
-                    start_time = (frame_count - chunk_size + 1) / fps if fps > 0 else (frame_count - chunk_size + 1) / 25
-                    end_time = frame_count / fps if fps > 0 else frame_count / 25
-                    chunk_record = AudioTranscriptChunk(
-                        job_id=job.id,
-                        chunk_index=chunk_index,
-                        start_time=start_time,
-                        end_time=end_time,
-                        transcript=transcript
-                    )
-                    session.add(chunk_record)
-                    session.flush()
-
-                    # Create FrameTranscriptAssociation (bulk)
-                    chunk_frames = session.exec(
-                        select(VideoFrameTimeseries)
-                        .where(
-                            (VideoFrameTimeseries.job_id == job.id) &
-                            (VideoFrameTimeseries.frame_number >= frame_count - chunk_size + 1) &
-                            (VideoFrameTimeseries.frame_number <= frame_count)
+            reused_frames = 0
+            cache_hits = 0
+            cache_misses = 0
+            image_filename = None
+            writer = BulkWriter(session)
+            frame_rows = []
+            vector_rows = []
+            pending_frames_info = []
+            if resume_frame:
+                all_frames_info, all_chunks_info, all_associations_info = load_checkpoint(session, job.id)
+                reused_frames = sum(info["inherited_from_frame"] is not None for info in all_frames_info)
+                print(f"Resuming job {job_id} at frame {resume_frame} ({len(all_frames_info)} frames already stored)")
+
+            keyframe_times = None
+            if sampling_mode == "keyframe":
+                keyframe_times = probe_keyframe_times(video_file_path)
+                if not keyframe_times:
+                    print(f"No keyframes found for job {job_id}; sampling 1 frame per second instead")
+                    sampling_mode, target_fps = "fps", 1.0
+
+            # Decoding, inference and persistence run as a pipeline of threads joined by
+            # bounded queues: decoding runs ahead of inference and JPEG/DB writes run
+            # behind it. Only sampled frames are decoded and analysed; frames without a
+            # scene change reuse the last analysed frame's results; YOLO runs per frame
+            # and BLIP captions are generated in batches and handed back in frame order.
+            # Frames found in the content-addressed analysis cache skip all three models.
+            if ANALYSIS_PROCESSES > 1:
+                # GPU-less nodes: contiguous segments of the video are analysed by a pool
+                # of processes with their own models and merged back here in frame order
+                decoding = None
+                inference = ThreadedStage(analyse_segments(
+                    video_file_path, fps, max_duration, total_frames, sampling_mode, frame_stride, target_fps,
+                    keyframe_times, scene_threshold, use_cache=analysis_cache.enabled, start_frame=resume_frame
+                ), "inference")
+            else:
+                # Get shared models (loaded once per process)
+                yolo_model = registry.get("yolo")
+                processor, blip_model = registry.get("blip")
+                embed_model = registry.get("embedder")
+                sampled = sample_frames(cap, fps, max_duration, sampling_mode, frame_stride, target_fps, keyframe_times,
+                                        start_frame=resume_frame)
+                decoding = ThreadedStage(sampled, "decode")
+                captioner = BatchCaptioner(processor, blip_model, DEVICE)
+                cache = analysis_cache if analysis_cache.enabled else None
+                analysed = caption_frames(detect_frames(decoding, yolo_model, scene_threshold, cache), captioner)
+                inference = ThreadedStage(embed_frames(analysed, embed_model), "inference")
+            image_writer = ImageWriter()
+            persist_stats = StageStats("persist")
+
+            try:
+                for (frame_number, timestamp, annotated_frame, object_names, inherited_from, cached), caption, embedding in inference:
+                    persist_start = time.perf_counter()
+                    if inherited_from is None:
+                        # Save frame image in <video_name> folder (encoded on the writer pool)
+                        image_filename = f"frame_{frame_number:05d}.jpg"
+                        written = image_writer.submit(os.path.join(frames_folder, image_filename), annotated_frame)
+                        if cached is not None and cached.caption is not None:
+                            cache_hits += 1
+                        elif cached is not None:
+                            cache_misses += 1
+                            written.add_done_callback(partial(cache_analysis, cached._replace(
+                                object_names=object_names, caption=caption, embedding=embedding
+                            )))
+                    else:
+                        # Same scene: point at the source frame's image
+                        reused_frames += 1
+
+                    # Transcript chunks cover fixed time windows, so their ranges stay
+                    # correct however sparsely frames were sampled. When a frame opens a
+                    # new window, the buffered frames are written before their chunk.
+                    frame_chunk = int(timestamp // CHUNK_SECONDS)
+                    if chunk_captions and frame_chunk != chunk_index:
+                        chunk_frame_ids.extend(save_frames(writer, frame_rows, vector_rows, pending_frames_info))
+                        chunk_info, associations_info = save_transcript_chunk(
+                            writer, job.id, chunk_index, chunk_captions, chunk_frame_ids,
+                            end_time=max(min((chunk_index + 1) * CHUNK_SECONDS, video_end), chunk_last_timestamp + 1 / fps),
+                            store_associations=store_associations
                         )
-                    ).all()
-                    associations = [
-                        FrameTranscriptAssociation(
-                            frame_id=assoc_frame.id,
-                            transcript_chunk_id=chunk_record.id
-                        ) for assoc_frame in chunk_frames
-                    ]
-                    session.add_all(associations)
-                    session.flush()
-
-                    # Save chunk info for JSON
-                    all_chunks_info.append({
-                        "chunk_index": chunk_index,
-                        "start_time": start_time,
-                        "end_time": end_time,
-                        "transcript": transcript
+                        all_chunks_info.append(chunk_info)
+                        all_associations_info.extend(associations_info)
+                        chunk_captions = []
+                        chunk_frame_ids = []
+                        # Checkpoint: commit the finished window once its images are on disk,
+                        # so a failed or interrupted job resumes from this frame
+                        image_writer.join()
+                        job.checkpoint_frame = frame_number
+                        job.updated_at = datetime.utcnow()
+                        session.commit()
+                    if not chunk_captions:
+                        chunk_index = frame_chunk
+                    chunk_captions.append(caption)
+                    chunk_last_timestamp = timestamp
+
+                    # Buffer frame metadata and vector embedding for bulk insert
+                    frame_rows.append({
+                        "job_id": job.id,
+                        "frame_number": frame_number,
+                        "timestamp": timestamp,
+                        "image_file": image_filename,
+                        "objects": json.dumps(object_names),
+                        "caption": caption,
+                        "inherited_from_frame": inherited_from
+                    })
+                    vector_rows.append({
+                        "job_id": job.id,
+                        "frame_number": frame_number,
+                        "vector": encode_vector(embedding, VECTOR_PRECISION),
+                        "vector_dtype": VECTOR_PRECISION,
+                        "caption": caption
                     })
 
-                    # Save association info for JSON
-                    for assoc in associations:
-                        all_associations_info.append({
-                            "frame_id": assoc.frame_id,
-                            "transcript_chunk_id": assoc.transcript_chunk_id
-                        })
-
-                    chunk_captions = []
-                    chunk_index += 1
-
-                # Save frame info for JSON
-                all_frames_info.append({
-                    "frame_number": frame_count,
-                    "timestamp": timestamp,
-                    "image_file": image_filename,
-                    "objects": object_names,
-                    "caption": caption,
-                    "vector_id": vector_record.id
-                })
-
-                frame_count += 1
-
-            # Handle leftover transcript chunk
+                    # Save frame info for JSON (vector_id is filled in on insert)
+                    frame_info = {
+                        "frame_number": frame_number,
+                        "timestamp": timestamp,
+                        "image_file": image_filename,
+                        "objects": object_names,
+                        "caption": caption,
+                        "inherited_from_frame": inherited_from,
+                        "vector_id": None
+                    }
+                    all_frames_info.append(frame_info)
+                    pending_frames_info.append(frame_info)
+                    if len(frame_rows) >= writer.batch_size:
+                        # Buffered frames all belong to the current window
+                        chunk_frame_ids.extend(save_frames(writer, frame_rows, vector_rows, pending_frames_info))
+                    persist_stats.add_busy(time.perf_counter() - persist_start)
+
+                image_writer.join()
+            finally:
+                inference.close()
+                if decoding is not None:
+                    decoding.close()
+                image_writer.close()
+                cap.release()
+
+            # Write remaining buffered frames and the leftover transcript chunk
+            chunk_frame_ids.extend(save_frames(writer, frame_rows, vector_rows, pending_frames_info))
             if chunk_captions:
-                transcript = " ".join(chunk_captions)
-                start_time = (frame_count - len(chunk_captions)) / fps if fps > 0 else (frame_count - len(chunk_captions)) / 25
-                end_time = frame_count / fps if fps > 0 else frame_count / 25
-                chunk_record = AudioTranscriptChunk(
-                    job_id=job.id,
-                    chunk_index=chunk_index,
-                    start_time=start_time,
-                    end_time=end_time,
-                    transcript=transcript
+                chunk_info, associations_info = save_transcript_chunk(
+                    writer, job.id, chunk_index, chunk_captions, chunk_frame_ids,
+                    end_time=max(min((chunk_index + 1) * CHUNK_SECONDS, video_end), chunk_last_timestamp + 1 / fps),
+                    store_associations=store_associations
                 )
-                session.add(chunk_record)
-                session.flush()
-
-                # Create FrameTranscriptAssociation for leftover chunk
-                leftover_frames = session.exec(
-                    select(VideoFrameTimeseries)
-                    .where(
-                        (VideoFrameTimeseries.job_id == job.id) &
-                        (VideoFrameTimeseries.frame_number >= frame_count - len(chunk_captions)) &
-                        (VideoFrameTimeseries.frame_number < frame_count)
-                    )
-                ).all()
-                associations = [
-                    FrameTranscriptAssociation(
-                        frame_id=assoc_frame.id,
-                        transcript_chunk_id=chunk_record.id
-                    ) for assoc_frame in leftover_frames
-                ]
-                session.add_all(associations)
-                session.flush()
-
-                # Save chunk info for JSON
-                all_chunks_info.append({
-                    "chunk_index": chunk_index,
-                    "start_time": start_time,
-                    "end_time": end_time,
-                    "transcript": transcript
-                })
-
-                # Save association info for JSON
-                for assoc in associations:
-                    all_associations_info.append({
-                        "frame_id": assoc.frame_id,
-                        "transcript_chunk_id": assoc.transcript_chunk_id
-                    })
+                all_chunks_info.append(chunk_info)
+                all_associations_info.extend(associations_info)
 
-            cap.release()
+            scene_skip_ratio = reused_frames / len(all_frames_info) if all_frames_info else 0.0
+            pipeline_stats = [stage.stats.as_dict() for stage in (decoding, inference, image_writer) if stage is not None]
+            pipeline_stats.append({**persist_stats.as_dict(), "bulk_insert": writer.stats()})
 
             # Save JSON file in <video_name> folder
             with open(json_path, "w", encoding="utf-8") as f:
                 json.dump({
                     "video_name": video_name,
                     "video_file": f"{video_name}.mp4",
+                    "fps": fps,
+                    "sampling_mode": sampling_mode,
+                    "scene_change": {
+                        "threshold": scene_threshold,
+                        "sampled_frames": len(all_frames_info),
+                        "reused_frames": reused_frames,
+                        "skip_ratio": scene_skip_ratio,
+                    },
+                    "analysis_cache": {"hits": cache_hits, "misses": cache_misses},
+                    "pipeline": pipeline_stats,
                     "frames": all_frames_info,
                     "transcript_chunks": all_chunks_info,
                     "frame_transcript_associations": all_associations_info,
@@ -320,21 +523,97 @@ def process_video(job_id: int, youtube_url: str | None, local_path: str | None):
 
             job.status = "complete"
             job.result_json_path = json_path
+            job.scene_skip_ratio = scene_skip_ratio
+            job.pipeline_stats = json.dumps(pipeline_stats)
             job.updated_at = datetime.utcnow()
             session.commit()
 
         except Exception as e:
+            # Discard rows written after the last checkpoint; /job/{id}/resume continues from it
+            session.rollback()
             job.status = "error"
             job.error_msg = str(e)
             job.updated_at = datetime.utcnow()
             session.commit()
-            print(f"Error processing video for job {job_id}: {e}")
+            print(f"Error processing video for job {job_id} (checkpoint frame {job.checkpoint_frame}): {e}")
+
+@app.get("/models")
+def get_models():
+    return registry.status()
+
+@app.get("/analysis-cache")
+def get_analysis_cache():
+    return analysis_cache.stats()
+
+@app.post("/search")
+def search_frames(request: FrameSearchRequest, session: Session = Depends(get_session)):
+    if request.top_k < 1 or request.nprobe < 1:
+        raise HTTPException(status_code=400, detail="top_k and nprobe must be >= 1")
+    query_embedding = registry.get("embedder").encode(request.query, convert_to_numpy=True)
+    # Pick up vectors committed by job workers since the last search
+    frame_index.maybe_sync(engine)
+    hits = frame_index.search(
+        query_embedding, request.top_k, job_id=request.job_id, start_time=request.start_time,
+        end_time=request.end_time, nprobe=request.nprobe, exact=request.exact
+    )
+    # Hydrate the hits with their frame rows in one query
+    rows = session.exec(
+        select(VideoFrameVector, VideoFrameTimeseries)
+        .join(VideoFrameTimeseries, VideoFrameTimeseries.id == VideoFrameVector.timeseries_id)
+        .where(VideoFrameVector.id.in_([hit["vector_id"] for hit in hits]))
+    ).all()
+    frames = {vector.id: (vector, frame) for vector, frame in rows}
+    results = []
+    for hit in hits:
+        if hit["vector_id"] not in frames:
+            continue
+        vector, frame = frames[hit["vector_id"]]
+        results.append({
+            "vector_id": vector.id,
+            "frame_id": frame.id,
+            "job_id": vector.job_id,
+            "frame_number": vector.frame_number,
+            "timestamp": frame.timestamp,
+            "image_file": frame.image_file,
+            "caption": vector.caption,
+            "score": hit["score"]
+        })
+    return results
+
+@app.get("/search/stats")
+def get_search_stats():
+    return frame_index.stats()
+
+@app.get("/queue")
+def get_queue():
+    return worker_pool.status()
 
 @app.get("/job/{job_id}")
 def get_job(job_id: int, session: Session = Depends(get_session)):
     job = session.get(VideoJob, job_id)
     return job
 
+@app.post("/job/{job_id}/resume")
+def resume_job(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(VideoJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status != "error":
+        raise HTTPException(status_code=400, detail=f"Job {job_id} is {job.status}; only failed jobs can be resumed")
+    # Re-queue it; the worker continues from job.checkpoint_frame
+    job.status = "pending"
+    job.error_msg = None
+    job.attempts = 0
+    job.updated_at = datetime.utcnow()
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        existing = find_identical_job(session, job.fingerprint, ACTIVE_JOB_STATUSES)
+        raise HTTPException(status_code=409, detail=f"An identical job ({existing.id if existing else 'unknown'}) "
+                                                    f"is already queued or running")
+    return {"job_id": job.id, "status": job.status, "checkpoint_frame": job.checkpoint_frame}
+
 @app.get("/frames/{job_id}")
 def get_frames(job_id: int, session: Session = Depends(get_session)):
     frames = session.exec(select(VideoFrameTimeseries).where(VideoFrameTimeseries.job_id == job_id)).all()
@@ -343,12 +622,14 @@ def get_frames(job_id: int, session: Session = Depends(get_session)):
 @app.get("/vectors/{job_id}")
 def get_vectors(job_id: int, session: Session = Depends(get_session)):
     vectors = session.exec(select(VideoFrameVector).where(VideoFrameVector.job_id == job_id)).all()
-    return vectors
+    return [{**vector.model_dump(), "vector": vector_to_list(vector.vector, vector.vector_dtype)} for vector in vectors]
 
 @app.get("/frame-vector/{frame_id}")
 def get_frame_vector(frame_id: int, session: Session = Depends(get_session)):
     frame = session.get(VideoFrameTimeseries, frame_id)
     vector = session.exec(select(VideoFrameVector).where(VideoFrameVector.timeseries_id == frame_id)).first()
+    if vector:
+        vector = {**vector.model_dump(), "vector": vector_to_list(vector.vector, vector.vector_dtype)}
     return {"vector": vector, "timeseries": frame}
 
 @app.get("/transcripts/{job_id}")
@@ -384,9 +665,22 @@ def get_transcript_for_frame(frame_id: int, session: Session = Depends(get_sessi
 
 @app.get("/frame-transcript-associations/{job_id}")
 def get_frame_transcript_associations(job_id: int, session: Session = Depends(get_session)):
+    job = session.get(VideoJob, job_id)
+    if job and not job.store_associations:
+        # No association rows were written; link frames to the chunk whose window covers them
+        links = session.exec(
+            select(VideoFrameTimeseries.id, AudioTranscriptChunk.id)
+            .join(AudioTranscriptChunk, AudioTranscriptChunk.job_id == VideoFrameTimeseries.job_id)
+            .where(
+                (VideoFrameTimeseries.job_id == job_id) &
+                (AudioTranscriptChunk.start_time <= VideoFrameTimeseries.timestamp) &
+                (AudioTranscriptChunk.end_time > VideoFrameTimeseries.timestamp)
+            )
+        ).all()
+        return [{"frame_id": frame_id, "transcript_chunk_id": chunk_id} for frame_id, chunk_id in links]
     associations = session.exec(
         select(FrameTranscriptAssociation)
         .join(VideoFrameTimeseries)
         .where(VideoFrameTimeseries.job_id == job_id)
     ).all()
-    return associations
\ No newline at end of file
+    return associations
@@ -1,14 +1,37 @@
 from typing import Optional, List
+from sqlalchemy import Index, text
 from sqlmodel import SQLModel, Field, Relationship
 from datetime import datetime
 
+# Statuses of queued or running jobs; the database allows one such job per fingerprint
+ACTIVE_JOB_STATUSES = ("pending", "processing")
+_ACTIVE_JOB_FILTER = text("status IN ('pending', 'processing')")
+
 class VideoJob(SQLModel, table=True):
+    __table_args__ = (
+        # Keeps identical submissions to different API processes from queueing two jobs
+        Index("ux_videojob_active_fingerprint", "fingerprint", unique=True,
+              postgresql_where=_ACTIVE_JOB_FILTER, sqlite_where=_ACTIVE_JOB_FILTER),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     video_name: str
     url: str
-    status: str = "pending"
+    local_path: Optional[str] = None
+    settings: Optional[str] = None  # JSON-encoded processing options (sampling, scene threshold, ...)
+    status: str = Field(default="pending", index=True)
+    priority: int = 0  # higher-priority pending jobs are claimed first
+    attempts: int = 0  # times a worker has claimed the job
+    worker_id: Optional[str] = None  # "host:pid" of the worker running the job
+    started_at: Optional[datetime] = None
+    heartbeat_at: Optional[datetime] = None  # refreshed while running; stale means the worker died
+    checkpoint_frame: int = 0  # frames before this frame_number are committed; resuming continues here
     result_json_path: Optional[str] = None
     error_msg: Optional[str] = None
+    fingerprint: Optional[str] = Field(default=None, index=True)  # hash of source, duration, settings and models
+    scene_skip_ratio: Optional[float] = None  # Share of sampled frames that reused earlier results
+    pipeline_stats: Optional[str] = None  # JSON-encoded per-stage item counts, timings and queue depths
+    store_associations: bool = True  # False when frame/chunk links are derived from timestamps
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
     updated_at: Optional[datetime] = Field(default=None, nullable=True)
 
@@ -23,6 +46,7 @@ class VideoFrameTimeseries(SQLModel, table=True):
     image_file: str
     objects: str
     caption: str
+    inherited_from_frame: Optional[int] = None  # frame_number whose results were reused (no scene change)
 
     job: Optional[VideoJob] = Relationship(back_populates="frames")
     vectors: List["VideoFrameVector"] = Relationship(back_populates="timeseries")
@@ -32,7 +56,8 @@ class VideoFrameVector(SQLModel, table=True):
     job_id: int = Field(foreign_key="videojob.id")
     timeseries_id: int = Field(foreign_key="videoframetimeseries.id")
     frame_number: int
-    vector: str
+    vector: bytes  # embedding bytes in vector_dtype format (see vector_codec)
+    vector_dtype: str = "float32"  # "float32", "float16" or "int8"
     caption: str
 
     timeseries: Optional[VideoFrameTimeseries] = Relationship(back_populates="vectors")
@@ -0,0 +1,187 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+import cv2
+
+# Items buffered between stages; bounds the decoded/annotated frames held in memory
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "32"))
+# Threads encoding and writing annotated JPEGs (cv2.imencode releases the GIL)
+JPEG_WORKERS = int(os.getenv("JPEG_WORKERS", "2"))
+
+_DONE = object()
+# Yielded by ThreadedStage.poll when its deadline passes before the next item arrives
+IDLE = object()
+
+
+class StageStats:
+    """Timing and queue-depth counters for one pipeline stage."""
+
+    def __init__(self, name: str, workers: int = 1):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_seconds = 0.0     # time spent producing items (includes waiting on upstream)
+        self.blocked_seconds = 0.0  # time waiting for room downstream (backpressure)
+        self.starved_seconds = 0.0  # time the consumer waited for this stage's output
+        self.max_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._lock = threading.Lock()
+
+    def record_depth(self, depth: int) -> None:
+        self.max_depth = max(self.max_depth, depth)
+        self._depth_total += depth
+        self._depth_samples += 1
+
+    def add_busy(self, seconds: float) -> None:
+        with self._lock:
+            self.busy_seconds += seconds
+            self.items += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "blocked_seconds": round(self.blocked_seconds, 3),
+            "starved_seconds": round(self.starved_seconds, 3),
+            "max_queue_depth": self.max_depth,
+            "avg_queue_depth": round(self._depth_total / self._depth_samples, 2) if self._depth_samples else 0.0,
+        }
+
+
+class ThreadedStage:
+    """
+    Runs an iterable on a background thread and hands its items downstream through a
+    bounded queue, so the stage works ahead of its consumer by at most maxsize items.
+    Exceptions raised by the stage are re-raised in the consuming thread.
+    """
+
+    def __init__(self, source: Iterable, name: str, maxsize: int = PIPELINE_QUEUE_SIZE):
+        self.stats = StageStats(name)
+        self._source = source
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, maxsize))
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name=f"{name}-stage", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            iterator = iter(self._source)
+            while not self._stop.is_set():
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                self.stats.add_busy(time.perf_counter() - start)
+                if not self._put(item):
+                    break
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._put(_DONE)
+
+    def _put(self, item: Any) -> bool:
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                self.stats.blocked_seconds += time.perf_counter() - start
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self) -> Iterator[Any]:
+        return self.poll(lambda: None)
+
+    def poll(self, time_left: Callable[[], Optional[float]]) -> Iterator[Any]:
+        """
+        Iterate the stage's items, yielding IDLE whenever time_left() (seconds, None for
+        no deadline) runs out before the next item arrives, so the consumer can act on
+        a deadline while its source is slow.
+        """
+        while True:
+            self.stats.record_depth(self._queue.qsize())
+            left = time_left()
+            if left is not None and left <= 0:
+                yield IDLE
+                continue
+            start = time.perf_counter()
+            try:
+                item = self._queue.get(timeout=0.1 if left is None else min(0.1, left))
+            except queue.Empty:
+                self.stats.starved_seconds += time.perf_counter() - start
+                if not self._thread.is_alive() and self._queue.empty():
+                    break
+                continue
+            self.stats.starved_seconds += time.perf_counter() - start
+            if item is _DONE:
+                break
+            yield item
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def close(self) -> None:
+        """Stop the stage early (e.g. when the consumer failed) and drain its queue."""
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+class ImageWriter:
+    """
+    Encodes and writes images on a thread pool, with at most max_pending writes in flight.
+    Already encoded images (bytes) are written as they are. Each write's future
+    resolves to the encoded bytes.
+    """
+
+    def __init__(self, workers: int = JPEG_WORKERS, max_pending: int = PIPELINE_QUEUE_SIZE):
+        self.stats = StageStats("jpeg_write", workers=workers)
+        self.max_pending = max(1, max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="jpeg")
+        self._pending: deque = deque()
+
+    def _write(self, path: str, image) -> bytes:
+        start = time.perf_counter()
+        if isinstance(image, bytes):
+            data = image
+        else:
+            ok, buffer = cv2.imencode(os.path.splitext(path)[1], image)
+            if not ok:
+                raise IOError(f"Failed to encode image {path}")
+            data = buffer.tobytes()
+        with open(path, "wb") as f:
+            f.write(data)
+        self.stats.add_busy(time.perf_counter() - start)
+        return data
+
+    def submit(self, path: str, image) -> Future:
+        self.stats.record_depth(len(self._pending))
+        start = time.perf_counter()
+        while len(self._pending) >= self.max_pending:
+            self._pending.popleft().result()
+        self.stats.blocked_seconds += time.perf_counter() - start
+        future = self._executor.submit(self._write, path, image)
+        self._pending.append(future)
+        return future
+
+    def join(self) -> None:
+        """Wait for all queued writes, raising the first write error."""
+        while self._pending:
+            self._pending.popleft().result()
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
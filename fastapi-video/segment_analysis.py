@@ -0,0 +1,131 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Iterator, List, Optional, Tuple
+
+import cv2
+import torch
+
+from frame_analysis import BatchCaptioner, sample_frames, detect_frames, caption_frames, embed_frames
+
+# Processes analysing segments of one video in parallel (1 = single-process pipeline)
+ANALYSIS_PROCESSES = int(os.getenv("ANALYSIS_PROCESSES", "1"))
+# torch intra-op threads per analysis process (0 = share the machine's cores evenly)
+TORCH_THREADS_PER_PROCESS = int(os.getenv("TORCH_THREADS_PER_PROCESS", "0"))
+# Segments per process; more, shorter segments even out slow scenes and shrink each buffered result
+SEGMENTS_PER_PROCESS = int(os.getenv("SEGMENTS_PER_PROCESS", "4"))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_config: Optional[Tuple[int, int]] = None
+_pool_lock = threading.Lock()
+
+
+def torch_threads_for(processes: int) -> int:
+    return TORCH_THREADS_PER_PROCESS or max(1, (os.cpu_count() or 1) // max(1, processes))
+
+
+def _init_process(torch_threads: int) -> None:
+    torch.set_num_threads(torch_threads)
+    cv2.setNumThreads(1)
+    from model_registry import registry
+    registry.warm_up(["yolo", "blip", "embedder"])
+
+
+def get_pool(processes: int, torch_threads: int) -> ProcessPoolExecutor:
+    """Process pool kept across jobs so each process loads its models once."""
+    global _pool, _pool_config
+    with _pool_lock:
+        if _pool is None or _pool_config != (processes, torch_threads):
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(
+                processes, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process, initargs=(torch_threads,)
+            )
+            _pool_config = (processes, torch_threads)
+        return _pool
+
+
+def split_segments(start_frame: int, end_frame: Optional[int], segments: int) -> List[Tuple[int, Optional[int]]]:
+    """Split [start_frame, end_frame) into up to `segments` contiguous ranges; the last one is open-ended."""
+    if not end_frame or end_frame <= start_frame or segments <= 1:
+        return [(start_frame, None)]
+    size = max(1, -(-(end_frame - start_frame) // segments))
+    starts = list(range(start_frame, end_frame, size))
+    return [(start, next_start) for start, next_start in zip(starts, starts[1:])] + [(starts[-1], None)]
+
+
+def analyse_segment(video_path: str, fps: float, max_duration: float, sampling_mode: str, frame_stride: int,
+                    target_fps: float, keyframe_times: Optional[List[float]], scene_threshold: float,
+                    use_cache: bool, start_frame: int, end_frame: Optional[int]) -> List[Tuple[Tuple, str, Any]]:
+    """
+    Analyse one segment in a pool process: the same detect/caption/embed chain as
+    process_video, on this process's own models. Annotated frames are JPEG-encoded
+    here so the parent only writes bytes. Returns (item, caption, embedding) tuples.
+    """
+    from model_registry import registry, DEVICE
+    from analysis_cache import analysis_cache
+
+    yolo_model = registry.get("yolo")
+    processor, blip_model = registry.get("blip")
+    embed_model = registry.get("embedder")
+    cache = analysis_cache if use_cache and analysis_cache.enabled else None
+
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video for segment starting at frame {start_frame}")
+    try:
+        sampled = sample_frames(cap, fps, max_duration, sampling_mode, frame_stride, target_fps, keyframe_times,
+                                start_frame=start_frame, end_frame=end_frame)
+        captioner = BatchCaptioner(processor, blip_model, DEVICE)
+        analysed = caption_frames(detect_frames(sampled, yolo_model, scene_threshold, cache), captioner)
+        results = []
+        for item, caption, embedding in embed_frames(analysed, embed_model):
+            annotated_frame = item[2]
+            if annotated_frame is not None and not isinstance(annotated_frame, bytes):
+                ok, buffer = cv2.imencode(".jpg", annotated_frame)
+                if not ok:
+                    raise IOError(f"Failed to encode frame {item[0]}")
+                item = (item[0], item[1], buffer.tobytes()) + item[3:]
+            results.append((item, caption, embedding))
+        return results
+    finally:
+        cap.release()
+
+
+def analyse_segments(video_path: str, fps: float, max_duration: float, total_frames: float, sampling_mode: str,
+                     frame_stride: int, target_fps: float, keyframe_times: Optional[List[float]],
+                     scene_threshold: float, use_cache: bool = True, processes: int = ANALYSIS_PROCESSES,
+                     start_frame: int = 0) -> Iterator[Tuple[Tuple, str, Any]]:
+    """
+    Split the video's frame range from start_frame into segments, analyse them on a pool of
+    `processes` processes (each seeking to its own segment start) and yield
+    (item, caption, embedding) in frame order, like embed_frames does. At most
+    processes + 1 segments are in flight, so finished results (JPEGs and embeddings)
+    don't pile up while earlier segments are persisted.
+    """
+    pool = get_pool(processes, torch_threads_for(processes))
+    end_frame = int(min(total_frames, max_duration * fps + 1)) if total_frames > 0 else int(max_duration * fps + 1)
+    segments = iter(split_segments(start_frame, end_frame, processes * SEGMENTS_PER_PROCESS))
+    futures = deque()
+
+    def submit_next() -> None:
+        segment = next(segments, None)
+        if segment is not None:
+            futures.append(pool.submit(analyse_segment, video_path, fps, max_duration, sampling_mode, frame_stride,
+                                       target_fps, keyframe_times, scene_threshold, use_cache, *segment))
+
+    for _ in range(processes + 1):
+        submit_next()
+    try:
+        while futures:
+            results = futures.popleft().result()
+            # Keep every process busy while this segment is consumed
+            submit_next()
+            yield from results
+            del results
+    finally:
+        for future in futures:
+            future.cancel()
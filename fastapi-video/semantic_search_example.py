@@ -1,22 +1,21 @@
 from sentence_transformers import SentenceTransformer
 from sqlmodel import Session, select
+from database import engine
 from models import VideoFrameVector
+from vector_index import FrameVectorIndex
 
-def semantic_search(query_text, top_n=5):
+def semantic_search(query_text, top_n=5, job_id=None):
+    # Same index the service's /search endpoint uses, restored from disk and
+    # topped up with any vectors written since it was saved
+    index = FrameVectorIndex()
+    index.load()
+    index.sync(engine)
     embed_model = SentenceTransformer('all-MiniLM-L6-v2')
-    query_vec = embed_model.encode(query_text).tolist()
-    session = Session(engine)
-    # Brute-force cosine similarity for demo; use pgvector for fast search
-    results = []
-    vectors = session.exec(select(VideoFrameVector)).all()
-    import numpy as np
-    def cosine(a, b):
-        a, b = np.array(a), np.array(b)
-        return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-    for v in vectors:
-        v_vec = json.loads(v.vector)
-        score = cosine(query_vec, v_vec)
-        results.append((score, v))
-    results = sorted(results, key=lambda x: -x[0])[:top_n]
-    session.close()
-    return [{"vector_id": v.id, "caption": v.caption, "score": score} for score, v in results]
\ No newline at end of file
+    query_vec = embed_model.encode(query_text, convert_to_numpy=True)
+    hits = index.search(query_vec, top_n, job_id=job_id)
+    with Session(engine) as session:
+        vectors = session.exec(
+            select(VideoFrameVector).where(VideoFrameVector.id.in_([hit["vector_id"] for hit in hits]))
+        ).all()
+    captions = {v.id: v.caption for v in vectors}
+    return [{"vector_id": hit["vector_id"], "caption": captions.get(hit["vector_id"]), "score": hit["score"]} for hit in hits]
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+# analysis_cache takes its model version from the model and frame modules
+pytest.importorskip("cv2")
+pytest.importorskip("torch")
+pytest.importorskip("ultralytics")
+
+from analysis_cache import AnalysisCache, CachedAnalysis  # noqa: E402
+
+
+def frame(seed):
+    return np.random.default_rng(seed).integers(0, 256, (36, 64, 3), dtype=np.uint8)
+
+
+def analysis(key, caption="a dog on a beach"):
+    return CachedAnalysis(key, ["dog (0.91)"], caption, np.arange(4, dtype=np.float32), b"jpeg" * 100)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return AnalysisCache(str(tmp_path / "analysis.db"), max_bytes=10_000, model_version="test")
+
+
+def test_miss_then_hit(cache):
+    missed = cache.lookup(frame(0))
+    assert missed.caption is None and missed.key.startswith("test:")
+    cache.put(analysis(missed.key))
+
+    hit = cache.lookup(frame(0))
+    assert hit.key == missed.key
+    assert hit.object_names == ["dog (0.91)"] and hit.caption == "a dog on a beach" and hit.image == b"jpeg" * 100
+    np.testing.assert_array_equal(hit.embedding, np.arange(4))
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["writes"], stats["entries"]) == (1, 1, 1, 1)
+
+
+def test_keys_depend_on_pixels_shape_and_model_version(cache, tmp_path):
+    assert cache.key(frame(0)) == cache.key(frame(0).copy())
+    assert cache.key(frame(0)) != cache.key(frame(1))
+    assert cache.key(frame(0)) != cache.key(frame(0).reshape(64, 36, 3))
+    other = AnalysisCache(cache.path, model_version="retrained")
+    assert other.key(frame(0)) != cache.key(frame(0))
+
+
+def test_evicts_least_recently_used(cache):
+    keys = [cache.key(frame(seed)) for seed in range(40)]
+    cache.put(analysis(keys[0]))
+    for key in keys[1:]:
+        cache.get(keys[0])  # keep the first entry in use
+        cache.put(analysis(key))
+
+    stats = cache.stats()
+    assert stats["evictions"] > 0
+    assert stats["bytes"] <= cache.max_bytes
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+
+
+def test_overwrite_keeps_byte_total(cache):
+    key = cache.key(frame(0))
+    cache.put(analysis(key, caption="short"))
+    cache.put(analysis(key, caption="a much longer caption than before"))
+    stats = cache.stats()
+    assert stats["entries"] == 1
+    assert stats["bytes"] == cache._connect().execute("SELECT SUM(size) FROM frame_analysis").fetchone()[0]
+
+
+def test_stats_are_shared_through_the_file(cache):
+    key = cache.key(frame(0))
+    cache.put(analysis(key))
+    other = AnalysisCache(cache.path, max_bytes=cache.max_bytes, model_version="test")
+    assert other.get(key) is not None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["writes"] == other.stats()["writes"] == 1
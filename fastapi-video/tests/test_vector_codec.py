@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+
+from vector_codec import decode_matrix, decode_vector, encode_vector, migrate_json_vectors, vector_to_list
+
+
+@pytest.fixture
+def vector():
+    return np.random.default_rng(0).standard_normal(384).astype(np.float32)
+
+
+def test_float32_round_trip_is_exact(vector):
+    blob = encode_vector(vector)
+    assert len(blob) == 384 * 4
+    np.testing.assert_array_equal(decode_vector(blob), vector)
+
+
+def test_float16_round_trip(vector):
+    blob = encode_vector(vector, "float16")
+    assert len(blob) == 384 * 2
+    decoded = decode_vector(blob, "float16")
+    assert decoded.dtype == np.float32
+    np.testing.assert_allclose(decoded, vector, rtol=1e-3, atol=1e-3)
+
+
+def test_int8_round_trip_stores_scale(vector):
+    blob = encode_vector(vector, "int8")
+    assert len(blob) == 384 + 4
+    decoded = decode_vector(blob, "int8")
+    scale = np.abs(vector).max() / 127
+    assert np.abs(decoded - vector).max() <= scale / 2 + 1e-6
+    # Ranking by cosine similarity is what the stored vectors are used for
+    cosine = decoded @ vector / (np.linalg.norm(decoded) * np.linalg.norm(vector))
+    assert cosine > 0.999
+
+
+def test_int8_zero_vector():
+    decoded = decode_vector(encode_vector(np.zeros(8), "int8"), "int8")
+    np.testing.assert_array_equal(decoded, np.zeros(8))
+
+
+def test_decode_matrix_mixed_formats(vector):
+    other = vector[::-1].copy()
+    matrix = decode_matrix([encode_vector(vector), encode_vector(other, "float16")], ["float32", "float16"])
+    assert matrix.shape == (2, 384)
+    np.testing.assert_array_equal(matrix[0], vector)
+    np.testing.assert_allclose(matrix[1], other, rtol=1e-3, atol=1e-3)
+
+
+def test_decode_matrix_float32_and_empty(vector):
+    matrix = decode_matrix([encode_vector(vector), encode_vector(-vector)])
+    np.testing.assert_array_equal(matrix, np.stack([vector, -vector]))
+    assert decode_matrix([]).shape == (0, 0)
+
+
+def test_vector_to_list():
+    assert vector_to_list(encode_vector([1.0, -2.5])) == [1.0, -2.5]
+
+
+def test_migrate_json_vectors(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'vectors.db'}")
+    rows = [[0.5, -1.0, 2.0], [3.0, 0.0, -0.25], [1.0, 1.0, 1.0]]
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE framevector (id INTEGER PRIMARY KEY, vector TEXT)"))
+        conn.execute(text("INSERT INTO framevector (vector) VALUES (:vector)"),
+                     [{"vector": json.dumps(row)} for row in rows])
+
+    assert migrate_json_vectors(engine, "framevector", batch_size=2) == 3
+    with engine.connect() as conn:
+        stored = conn.execute(text("SELECT vector, vector_dtype FROM framevector ORDER BY id")).all()
+    assert [vector_to_list(blob, dtype) for blob, dtype in stored] == rows
+    # Already migrated: nothing to do
+    assert migrate_json_vectors(engine, "framevector") == 0
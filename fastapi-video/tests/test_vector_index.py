@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+import vector_index
+from vector_index import FrameVectorIndex, normalise
+
+
+def clustered_vectors(n, dim=32, clusters=64, seed=0):
+    """Caption-like embeddings: noisy points around a set of topics."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    return (centres[rng.integers(clusters, size=n)] + 0.3 * rng.standard_normal((n, dim))).astype(np.float32)
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(vector_index, "ANN_MIN_TRAIN", 1000)
+    vectors = clustered_vectors(5000)
+    index = FrameVectorIndex(path=None)
+    ids = np.arange(1, len(vectors) + 1)
+    index.add(ids, ids % 7, ids * 0.5, vectors)
+    return index
+
+
+def ids_of(hits):
+    return [hit["vector_id"] for hit in hits]
+
+
+def test_exact_search_matches_brute_force(index):
+    vectors = normalise(clustered_vectors(5000))
+    query = clustered_vectors(1, seed=1)[0]
+    expected = np.argsort(-(vectors @ normalise(query)[0]))[:10] + 1
+    assert ids_of(index.search(query, k=10, exact=True)) == expected.tolist()
+
+
+def test_ivf_recall_against_exact_search(index):
+    assert index.centroids is not None
+    queries = clustered_vectors(50, seed=2)
+    recall = np.mean([
+        len(set(ids_of(index.search(query, k=10))) & set(ids_of(index.search(query, k=10, exact=True)))) / 10
+        for query in queries
+    ])
+    assert recall >= 0.9
+
+
+def test_filtered_search(index):
+    query = clustered_vectors(1, seed=3)[0]
+    hits = index.search(query, k=5, job_id=3, start_time=100.0, end_time=1000.0)
+    assert len(hits) == 5
+    assert all(hit["job_id"] == 3 and 100.0 <= hit["timestamp"] < 1000.0 for hit in hits)
+    assert ids_of(hits) == ids_of(index.search(query, k=5, job_id=3, start_time=100.0, end_time=1000.0, exact=True))
+
+
+def test_incremental_adds_are_searchable(index):
+    vector = clustered_vectors(1, seed=4)
+    index.add([99999], 42, [1.0], vector)
+    assert index.search(vector[0], k=1)[0]["vector_id"] == 99999
+    assert index.max_id == 99999
+
+
+def test_untrained_index_scans_exactly():
+    index = FrameVectorIndex(path=None)
+    assert index.search(np.ones(4), k=3) == []
+    index.add([1, 2, 3], 1, [0.0, 1.0, 2.0], np.eye(3, 4))
+    assert index.centroids is None
+    assert ids_of(index.search([0, 1, 0, 0], k=2))[0] == 2
+
+
+def test_dimension_mismatch_is_rejected(index):
+    with pytest.raises(ValueError):
+        index.add([100000], 1, [0.0], np.ones((1, 8)))
+
+
+def test_save_and_load(index, tmp_path):
+    index.path = str(tmp_path / "index.npz")
+    index.gaps = [(10, 12, 0.0)]
+    index.save()
+    restored = FrameVectorIndex(path=index.path)
+    assert restored.load()
+    assert restored.size == index.size and restored.max_id == index.max_id
+    assert [gap[:2] for gap in restored.gaps] == [(10, 12)]
+    query = clustered_vectors(1, seed=5)[0]
+    assert ids_of(restored.search(query, k=10)) == ids_of(index.search(query, k=10))
+
+
+def test_missing_ranges():
+    assert FrameVectorIndex._missing(1, 10, [1, 2, 5, 9], 0.0) == [(3, 4, 0.0), (6, 8, 0.0), (10, 10, 0.0)]
+    assert FrameVectorIndex._missing(1, 3, [1, 2, 3], 0.0) == []
@@ -0,0 +1,89 @@
+import json
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import Engine, LargeBinary, inspect, text
+
+# Embeddings are stored as raw little-endian bytes (bytea / BLOB) in one of these
+# formats, recorded per row in `vector_dtype`. int8 rows hold one byte per value
+# followed by the float32 scale that maps them back (value = byte * scale).
+VECTOR_DTYPE = np.dtype("<f4")
+VECTOR_FORMATS = {"float32": np.dtype("<f4"), "float16": np.dtype("<f2"), "int8": np.dtype("i1")}
+# Format new embeddings are written in
+VECTOR_PRECISION = os.getenv("VECTOR_PRECISION", "float32")
+if VECTOR_PRECISION not in VECTOR_FORMATS:
+    raise ValueError(f"VECTOR_PRECISION must be one of {', '.join(VECTOR_FORMATS)}")
+
+
+def encode_vector(values, dtype: str = "float32") -> bytes:
+    """Serialise an embedding (list or array) to bytes in the given format."""
+    values = np.asarray(values, dtype=VECTOR_DTYPE)
+    if dtype == "int8":
+        scale = float(np.abs(values).max()) / 127 or 1.0
+        quantised = np.clip(np.rint(values / scale), -127, 127).astype(VECTOR_FORMATS["int8"])
+        return quantised.tobytes() + np.array(scale, dtype=VECTOR_DTYPE).tobytes()
+    return values.astype(VECTOR_FORMATS[dtype]).tobytes()
+
+
+def decode_vector(blob: bytes, dtype: str = "float32") -> np.ndarray:
+    """Stored embedding as a float32 array (a zero-copy view for float32 rows)."""
+    if dtype == "int8":
+        scale = np.frombuffer(blob[-VECTOR_DTYPE.itemsize:], dtype=VECTOR_DTYPE)[0]
+        return np.frombuffer(blob[:-VECTOR_DTYPE.itemsize], dtype=VECTOR_FORMATS["int8"]).astype(VECTOR_DTYPE) * scale
+    return np.frombuffer(blob, dtype=VECTOR_FORMATS[dtype]).astype(VECTOR_DTYPE, copy=False)
+
+
+def decode_matrix(blobs: Sequence[bytes], dtypes: Optional[Sequence[str]] = None) -> np.ndarray:
+    """Decode equally sized stored embeddings into one (n, dim) float32 matrix."""
+    if not blobs:
+        return np.empty((0, 0), dtype=VECTOR_DTYPE)
+    if dtypes is None or all(dtype == "float32" for dtype in dtypes):
+        dim = len(blobs[0]) // VECTOR_DTYPE.itemsize
+        return np.frombuffer(b"".join(blobs), dtype=VECTOR_DTYPE).reshape(len(blobs), dim)
+    return np.stack([decode_vector(blob, dtype) for blob, dtype in zip(blobs, dtypes)])
+
+
+def vector_to_list(blob: bytes, dtype: str = "float32") -> List[float]:
+    """Embedding as a plain list for JSON responses."""
+    return decode_vector(blob, dtype).tolist()
+
+
+def migrate_json_vectors(engine: Engine, table: str, batch_size: int = 1000) -> int:
+    """
+    Convert a table's JSON-encoded `vector` text column to float32 bytes in place.
+    The old column is renamed to `vector_json`, a binary `vector` column is added,
+    rows are converted in batches and `vector_json` is dropped. Safe to re-run after
+    an interruption. Tables created before per-row formats existed also get a
+    `vector_dtype` column (existing rows are float32). Returns the number of rows converted.
+    """
+    columns = {col["name"]: col["type"] for col in inspect(engine).get_columns(table)}
+    if "vector_dtype" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN vector_dtype VARCHAR NOT NULL DEFAULT 'float32'"))
+    if "vector_json" not in columns:
+        if "vector" not in columns or isinstance(columns["vector"], LargeBinary):
+            return 0
+        binary_type = LargeBinary().compile(dialect=engine.dialect)
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} RENAME COLUMN vector TO vector_json"))
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN vector {binary_type}"))
+
+    converted = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(f"SELECT id, vector_json FROM {table} WHERE vector IS NULL LIMIT :limit"),
+                {"limit": batch_size}
+            ).all()
+            if not rows:
+                break
+            conn.execute(
+                text(f"UPDATE {table} SET vector = :vector WHERE id = :id"),
+                [{"id": row_id, "vector": encode_vector(json.loads(value))} for row_id, value in rows]
+            )
+            converted += len(rows)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {table} DROP COLUMN vector_json"))
+    return converted
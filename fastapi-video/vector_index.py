@@ -0,0 +1,383 @@
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import Engine
+from sqlmodel import Session, select
+
+from models import VideoFrameTimeseries, VideoFrameVector
+from vector_codec import decode_matrix
+
+# Where the index is persisted between restarts
+FRAME_INDEX_PATH = os.getenv("FRAME_INDEX_PATH", "../contents/index/frame_vectors.npz")
+# Inverted lists probed per query (higher = better recall, slower)
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Vectors needed before the coarse quantizer is trained; smaller indexes are scanned exactly
+ANN_MIN_TRAIN = int(os.getenv("ANN_MIN_TRAIN", "4096"))
+# Filtered searches that leave at most this many candidates are scanned exactly
+ANN_EXACT_THRESHOLD = int(os.getenv("ANN_EXACT_THRESHOLD", "20000"))
+# New vectors after which the index is written back to disk
+ANN_SAVE_EVERY = int(os.getenv("ANN_SAVE_EVERY", "10000"))
+# Minimum seconds between checks for vectors written by job workers
+ANN_SYNC_SECONDS = float(os.getenv("ANN_SYNC_SECONDS", "5"))
+# Seconds an id skipped by sync() is re-checked. Ids are assigned at INSERT but rows appear
+# at the job's next checkpoint commit, so a lower id can become visible after a higher
+# one; ids still missing after this long are taken to be rolled back.
+ANN_GAP_SECONDS = float(os.getenv("ANN_GAP_SECONDS", "3600"))
+
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLES_PER_LIST = 64
+ASSIGN_BATCH = 65536
+SYNC_BATCH = 5000
+
+
+def normalise(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class FrameVectorIndex:
+    """
+    IVF (inverted file) index over VideoFrameVector embeddings for cosine search
+    across jobs. Vectors are unit-normalised and grouped into lists around k-means
+    centroids; a query scores the centroids, then only the vectors in the nprobe
+    closest lists. Each vector carries its job_id and frame timestamp so searches
+    can be filtered. Until ANN_MIN_TRAIN vectors exist every search is exact.
+
+    The database stays the source of truth: the index remembers the highest vector
+    id it holds and the ids below it that were not yet committed, load() restores
+    the last saved copy and sync() appends whatever was written since.
+    """
+
+    def __init__(self, path: Optional[str] = FRAME_INDEX_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self.dim = 0
+        self.size = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.job_ids = np.empty(0, dtype=np.int64)
+        self.timestamps = np.empty(0, dtype=np.float32)
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.assign = np.empty(0, dtype=np.int32)
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self.max_id = 0
+        # Skipped id ranges (first, last, monotonic time first seen) that sync() re-checks
+        self.gaps: List[Tuple[int, int, float]] = []
+        self._sync_lock = threading.Lock()
+        self._lists: List[List[np.ndarray]] = []
+        self._unsaved = 0
+        self._last_sync = 0.0
+        self.searches = 0
+        self.search_seconds = 0.0
+
+    # ---- building -------------------------------------------------------
+
+    def _reserve(self, extra: int, dim: int) -> None:
+        if self.dim == 0:
+            self.dim = dim
+            self.vectors = np.empty((0, dim), dtype=np.float32)
+        elif dim != self.dim:
+            raise ValueError(f"Vector dimension {dim} does not match index dimension {self.dim}")
+        needed = self.size + extra
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 1024)
+
+        def grow(array: np.ndarray) -> np.ndarray:
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        self.ids, self.job_ids, self.timestamps = grow(self.ids), grow(self.job_ids), grow(self.timestamps)
+        self.vectors, self.assign = grow(self.vectors), grow(self.assign)
+
+    def _nearest_centroid(self, vectors: np.ndarray) -> np.ndarray:
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for offset in range(0, len(vectors), ASSIGN_BATCH):
+            block = vectors[offset:offset + ASSIGN_BATCH]
+            assign[offset:offset + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+        return assign
+
+    def _build_lists(self) -> None:
+        assign = self.assign[:self.size]
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+        self._lists = [[order[bounds[i]:bounds[i + 1]]] for i in range(len(self.centroids))]
+
+    def train(self, seed: int = 0) -> None:
+        """(Re)train the coarse quantizer with spherical k-means on a sample of the vectors."""
+        with self._lock:
+            if self.size < ANN_MIN_TRAIN:
+                return
+            start = time.perf_counter()
+            vectors = self.vectors[:self.size]
+            nlist = max(1, int(np.sqrt(self.size)))
+            rng = np.random.default_rng(seed)
+            sample_size = min(self.size, nlist * KMEANS_SAMPLES_PER_LIST)
+            sample = vectors[rng.choice(self.size, sample_size, replace=False)]
+            centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+            for _ in range(KMEANS_ITERATIONS):
+                labels = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, labels, sample)
+                empty = np.bincount(labels, minlength=nlist) == 0
+                # Re-seed empty lists from random sample points
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()))]
+                centroids = normalise(sums)
+            self.centroids = centroids
+            self.assign[:self.size] = self._nearest_centroid(vectors)
+            self._build_lists()
+            self.trained_size = self.size
+            print(f"Trained frame index: {self.size} vectors, {nlist} lists in {time.perf_counter() - start:.1f}s")
+
+    def add(self, ids: Sequence[int], job_ids, timestamps, vectors) -> None:
+        """Append vectors; job_ids may be a single id shared by all rows."""
+        if len(ids) == 0:
+            return
+        vectors = normalise(vectors)
+        with self._lock:
+            self._reserve(len(ids), vectors.shape[1])
+            new = slice(self.size, self.size + len(ids))
+            self.ids[new] = ids
+            self.job_ids[new] = job_ids
+            self.timestamps[new] = timestamps
+            self.vectors[new] = vectors
+            self.size += len(ids)
+            self.max_id = max(self.max_id, int(np.max(ids)))
+            self._unsaved += len(ids)
+            if self.centroids is None or self.size >= 2 * self.trained_size:
+                # First training, or the index doubled since the quantizer was fitted
+                self.train()
+            else:
+                assign = self._nearest_centroid(vectors)
+                self.assign[new] = assign
+                positions = np.arange(new.start, new.stop)
+                for list_id in np.unique(assign):
+                    self._lists[list_id].append(positions[assign == list_id])
+
+    def _select_rows(self, session: Session, *conditions):
+        return session.exec(
+            select(VideoFrameVector.id, VideoFrameVector.job_id, VideoFrameTimeseries.timestamp,
+                   VideoFrameVector.vector, VideoFrameVector.vector_dtype)
+            .join(VideoFrameTimeseries, VideoFrameTimeseries.id == VideoFrameVector.timeseries_id)
+            .where(*conditions)
+            .order_by(VideoFrameVector.id)
+            .limit(SYNC_BATCH)
+        ).all()
+
+    def _add_rows(self, rows) -> None:
+        ids, job_ids, timestamps, blobs, dtypes = zip(*rows)
+        self.add(ids, job_ids, timestamps, decode_matrix(blobs, dtypes))
+
+    @staticmethod
+    def _missing(first: int, last: int, ids: Sequence[int], seen: float) -> List[Tuple[int, int, float]]:
+        """Ranges of [first, last] not covered by the ascending ids."""
+        gaps = []
+        for id_ in ids:
+            if id_ > first:
+                gaps.append((first, id_ - 1, seen))
+            first = id_ + 1
+        if first <= last:
+            gaps.append((first, last, seen))
+        return gaps
+
+    def _fill_gaps(self, session: Session) -> int:
+        """Add rows committed inside skipped id ranges; forget ranges older than ANN_GAP_SECONDS."""
+        now = time.monotonic()
+        added = 0
+        gaps = []
+        for first, last, seen in self.gaps:
+            while first <= last:
+                rows = self._select_rows(session, VideoFrameVector.id >= first, VideoFrameVector.id <= last)
+                if not rows:
+                    gaps.append((first, last, seen))
+                    break
+                self._add_rows(rows)
+                added += len(rows)
+                ids = [row[0] for row in rows]
+                end = last if len(rows) < SYNC_BATCH else ids[-1]
+                gaps.extend(self._missing(first, end, ids, seen))
+                first = end + 1
+        expired = sum(last - first + 1 for first, last, seen in gaps if now - seen >= ANN_GAP_SECONDS)
+        if expired:
+            print(f"Frame index: {expired} vector ids missing for {ANN_GAP_SECONDS:.0f}s, assuming rolled back")
+        self.gaps = [gap for gap in gaps if now - gap[2] < ANN_GAP_SECONDS]
+        return added
+
+    def _sync(self, engine: Engine) -> int:
+        self._last_sync = time.monotonic()
+        with Session(engine) as session:
+            added = self._fill_gaps(session)
+            while True:
+                last_id = self.max_id
+                rows = self._select_rows(session, VideoFrameVector.id > last_id)
+                if not rows:
+                    break
+                # Ids skipped here may belong to a job that has not committed them yet
+                self.gaps.extend(self._missing(last_id + 1, rows[-1][0], [row[0] for row in rows], time.monotonic()))
+                self._add_rows(rows)
+                added += len(rows)
+        return added
+
+    def sync(self, engine: Engine) -> int:
+        """Add vectors written to the database since the index was last updated."""
+        # One sync at a time, so concurrent callers never add the same rows twice
+        with self._sync_lock:
+            return self._sync(engine)
+
+    def maybe_sync(self, engine: Engine) -> int:
+        """sync() at most every ANN_SYNC_SECONDS, saving once enough new vectors arrived."""
+        if time.monotonic() - self._last_sync < ANN_SYNC_SECONDS:
+            return 0
+        if not self._sync_lock.acquire(blocking=False):
+            # Another request is already syncing; search what the index has now
+            return 0
+        try:
+            added = self._sync(engine)
+        finally:
+            self._sync_lock.release()
+        self.maybe_save()
+        return added
+
+    # ---- search ---------------------------------------------------------
+
+    def _candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        probe = top_k(self.centroids @ query, nprobe)
+        parts = []
+        for list_id in probe:
+            blocks = self._lists[list_id]
+            if len(blocks) > 1:
+                # Merge blocks appended by incremental adds
+                blocks[:] = [np.concatenate(blocks)]
+            parts.append(blocks[0])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+
+    def search(self, query, k: int = 10, job_id: Optional[int] = None, start_time: Optional[float] = None,
+               end_time: Optional[float] = None, nprobe: int = ANN_NPROBE, exact: bool = False) -> List[Dict[str, Any]]:
+        """
+        Return up to k {"vector_id", "job_id", "timestamp", "score"} hits, best first,
+        restricted to job_id and start_time <= timestamp < end_time when given.
+        """
+        start = time.perf_counter()
+        query = normalise(query)[0]
+        with self._lock:
+            n = self.size
+            if n == 0 or k <= 0:
+                return []
+            mask = None
+            if job_id is not None or start_time is not None or end_time is not None:
+                mask = np.ones(n, dtype=bool)
+                if job_id is not None:
+                    mask &= self.job_ids[:n] == job_id
+                if start_time is not None:
+                    mask &= self.timestamps[:n] >= start_time
+                if end_time is not None:
+                    mask &= self.timestamps[:n] < end_time
+
+            if mask is None and (exact or self.centroids is None):
+                # Full scan without copying the matrix
+                candidates = np.arange(n)
+                scores = self.vectors[:n] @ query
+            else:
+                if exact or self.centroids is None or (mask is not None and mask.sum() <= ANN_EXACT_THRESHOLD):
+                    candidates = np.flatnonzero(mask)
+                else:
+                    candidates = self._candidates(query, nprobe)
+                    if mask is not None:
+                        candidates = candidates[mask[candidates]]
+                scores = self.vectors[candidates] @ query
+            best = top_k(scores, k)
+            hits = [
+                {
+                    "vector_id": int(self.ids[i]),
+                    "job_id": int(self.job_ids[i]),
+                    "timestamp": float(self.timestamps[i]),
+                    "score": float(score),
+                }
+                for i, score in zip(candidates[best], scores[best])
+            ]
+            self.searches += 1
+            self.search_seconds += time.perf_counter() - start
+            return hits
+
+    # ---- persistence ----------------------------------------------------
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp.npz"
+            n = self.size
+            np.savez(
+                tmp_path,
+                ids=self.ids[:n], job_ids=self.job_ids[:n], timestamps=self.timestamps[:n],
+                vectors=self.vectors[:n], assign=self.assign[:n],
+                centroids=self.centroids if self.centroids is not None else np.empty((0, self.dim), dtype=np.float32),
+                trained_size=np.array(self.trained_size),
+                gaps=np.array([gap[:2] for gap in self.gaps], dtype=np.int64).reshape(-1, 2),
+            )
+            os.replace(tmp_path, self.path)
+            self._unsaved = 0
+
+    def maybe_save(self) -> None:
+        if self._unsaved >= ANN_SAVE_EVERY:
+            self.save()
+
+    def load(self) -> bool:
+        """Restore the last saved index. Returns False (leaving it empty) if there is none."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as data:
+                with self._lock:
+                    self.ids, self.job_ids = data["ids"], data["job_ids"]
+                    self.timestamps, self.vectors, self.assign = data["timestamps"], data["vectors"], data["assign"]
+                    self.size = len(self.ids)
+                    self.dim = self.vectors.shape[1] if self.size else 0
+                    self.trained_size = int(data["trained_size"])
+                    self.max_id = int(self.ids.max()) if self.size else 0
+                    # Gaps saved before the restart get a fresh ANN_GAP_SECONDS to fill
+                    now = time.monotonic()
+                    gaps = data["gaps"] if "gaps" in data.files else np.empty((0, 2), dtype=np.int64)
+                    self.gaps = [(int(first), int(last), now) for first, last in gaps]
+                    centroids = data["centroids"]
+                    self.centroids = centroids if len(centroids) else None
+                    if self.centroids is not None:
+                        self._build_lists()
+            return True
+        except Exception as e:
+            print(f"Could not load frame index from {self.path}, rebuilding: {e}")
+            self.__init__(self.path)
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "vectors": self.size,
+            "dim": self.dim,
+            "lists": len(self.centroids) if self.centroids is not None else 0,
+            "trained_size": self.trained_size,
+            "pending_gap_ids": sum(last - first + 1 for first, last, _ in self.gaps),
+            "nprobe": ANN_NPROBE,
+            "searches": self.searches,
+            "avg_search_ms": round(self.search_seconds / self.searches * 1000, 2) if self.searches else None,
+            "path": self.path,
+        }
+
+
+# One index per service process
+frame_index = FrameVectorIndex()
@@ -5,15 +5,13 @@ import requests
 import cv2
 import json
 import shutil
-from ultralytics import YOLO
-from transformers import BlipProcessor, BlipForConditionalGeneration
-from sentence_transformers import SentenceTransformer
-import torch
-from PIL import Image
 from yt_dlp import YoutubeDL
 from database import get_session, engine
 from models import VideoFrameTimeseries, VideoFrameVector, AudioTranscriptChunk, FrameTranscriptAssociation
 from sqlmodel import Session, select
+from model_registry import registry, DEVICE
+from vector_codec import encode_vector
+from frame_analysis import BatchCaptioner, sample_frames, detect_frames, caption_frames
 
 def get_video_id_from_url(url):
     if not url:
@@ -79,15 +77,11 @@ def process_video(youtube_url: str | None, local_path: str | None, output_folder
         with YoutubeDL(ydl_opts) as ydl:
             ydl.download([youtube_url])
 
-    # Load models
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    yolo_model = YOLO('yolov8n.pt')
-    processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-    blip_model = BlipForConditionalGeneration.from_pretrained(
-        "Salesforce/blip-image-captioning-base"
-    ).to(device)
-    blip_model.eval()
-    embed_model = SentenceTransformer('all-MiniLM-L6-v2')
+    # Get shared models (loaded once per process)
+    device = DEVICE
+    yolo_model = registry.get("yolo")
+    processor, blip_model = registry.get("blip")
+    embed_model = registry.get("embedder")
 
     # Process video
     cap = cv2.VideoCapture(video_path)
@@ -104,27 +98,10 @@ def process_video(youtube_url: str | None, local_path: str | None, output_folder
     # DB session
     session = Session(engine)
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
+    captioner = BatchCaptioner(processor, blip_model, device)
+    frames = caption_frames(detect_frames(sample_frames(cap, fps, max_duration), yolo_model), captioner)
 
-        timestamp = frame_count / fps if fps > 0 else frame_count / 25
-        if timestamp > max_duration:
-            break
-
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        yolo_results = yolo_model(frame_rgb)
-        objects = [(int(box.cls), float(box.conf)) for box in yolo_results[0].boxes]
-        object_names = [f"{yolo_model.names[obj]} ({conf:.2f})" for obj, conf in objects]
-
-        pil_img = Image.fromarray(frame_rgb)
-        inputs = processor(pil_img, return_tensors="pt").to(device)
-        with torch.no_grad():
-            output_ids = blip_model.generate(**inputs, max_length=50)
-            caption = processor.decode(output_ids[0], skip_special_tokens=True)
-
-        annotated_frame = yolo_results[0].plot()
+    for (frame_count, timestamp, annotated_frame, object_names, _, _), caption in frames:
         image_filename = f"frame_{frame_count:05d}.jpg"
         image_path = os.path.join(output_folder, image_filename)
         cv2.imwrite(image_path, annotated_frame)
@@ -142,12 +119,12 @@ def process_video(youtube_url: str | None, local_path: str | None, output_folder
         session.flush()
 
         # Store vector data
-        embedding = embed_model.encode(caption).tolist()
+        embedding = embed_model.encode(caption, convert_to_numpy=True)
         vec_row = VideoFrameVector(
             job_id=job_id,
             timeseries_id=ts_row.id,
             frame_number=frame_count,
-            vector=json.dumps(embedding),
+            vector=encode_vector(embedding),
             caption=caption,
         )
         session.add(vec_row)
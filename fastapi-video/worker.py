@@ -0,0 +1,57 @@
+"""
+Video job workers: claim pending VideoJob rows and run process_video outside the
+web server. Run this next to the API (with EMBEDDED_WORKERS=0 on the API) to scale
+workers separately from HTTP replicas.
+
+Usage:
+    python worker.py                # VIDEO_WORKERS processes (default 1)
+    python worker.py --workers 4
+"""
+import argparse
+import json
+import os
+
+from sqlmodel import Session
+
+from database import create_db_and_tables, engine
+from job_queue import WorkerPool, worker_loop
+from models import VideoJob
+
+# Concurrent video jobs (each worker process loads its own YOLO/BLIP/embedder)
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "1"))
+# Start VIDEO_WORKERS worker processes from the API process itself
+EMBEDDED_WORKERS = os.getenv("EMBEDDED_WORKERS", "1") == "1"
+
+
+def run_video_job(job_id: int) -> None:
+    # Imported here so only worker processes load the models
+    from main import process_video
+
+    with Session(engine) as session:
+        job = session.get(VideoJob, job_id)
+        url, local_path = job.url, job.local_path
+        settings = json.loads(job.settings or "{}")
+    process_video(job_id, None if local_path else url, local_path, **settings)
+
+
+def video_worker(stop) -> None:
+    worker_loop(VideoJob, run_video_job, stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=VIDEO_WORKERS)
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    os.makedirs("../contents/media", exist_ok=True)
+    pool = WorkerPool(VideoJob, video_worker, args.workers, name="video-worker")
+    pool.start()
+    try:
+        pool.join()
+    except KeyboardInterrupt:
+        pool.stop()
+
+
+if __name__ == "__main__":
+    main()